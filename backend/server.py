@@ -1,21 +1,55 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import os
+import re
+import math
+import mmap
+import struct
+import subprocess
+import sys
+import argparse
+import time
+import bisect
+import fcntl
+from collections import OrderedDict, deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import shutil
+import tempfile
+import asyncio
 import logging
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, List, Literal, Optional, Union
 import uuid
-from datetime import datetime, timedelta
+import mimetypes
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote, urlparse
+import anyio
+import base64
+import gzip
 import hashlib
 import jwt
 import json
+import xml.etree.ElementTree as ET
 import aiofiles
 from passlib.context import CryptContext
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,18 +59,213 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Indexes backing the queries below, by collection. They are reconciled at
+# startup according to MONGO_INDEX_MODE: "reconcile" creates missing indexes and
+# rebuilds changed ones, "check" only logs a report, "off" does nothing.
+# Indexes not declared here are never dropped.
+MONGO_INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "podcasts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("creator_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="creator_id_created_at_id"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="category_created_at_id"),
+        IndexModel([("title", TEXT), ("description", TEXT), ("category", TEXT)], name="search_text",
+                   weights={"title": 10, "category": 5, "description": 1}, default_language="english"),
+    ],
+    "episodes": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("podcast_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="podcast_id_created_at_id"),
+        IndexModel([("sha256", ASCENDING)], name="sha256"),
+        IndexModel([("audio_file", ASCENDING)], name="audio_file"),
+        IndexModel([("title", TEXT), ("description", TEXT)], name="search_text",
+                   weights={"title": 10, "description": 1}, default_language="english"),
+    ],
+    "episode_stats": [
+        IndexModel([("episode_id", ASCENDING), ("bucket", ASCENDING)], name="episode_id_bucket", unique=True),
+    ],
+    "trending": [
+        IndexModel([("score", ASCENDING)], name="score"),
+    ],
+    "progress": [
+        IndexModel([("user_id", ASCENDING), ("episode_id", ASCENDING)], name="user_id_episode_id", unique=True),
+    ],
+    "subscriptions": [
+        IndexModel([("user_id", ASCENDING), ("podcast_id", ASCENDING)], name="user_id_podcast_id", unique=True),
+        IndexModel([("podcast_id", ASCENDING)], name="podcast_id"),
+    ],
+    "inbox": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("episode_id", DESCENDING)],
+                   name="user_id_created_at_episode_id", unique=True),
+    ],
+}
+MONGO_INDEX_MODE = os.environ.get("MONGO_INDEX_MODE", "reconcile")
+
 # JWT and Password settings
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with any other bcrypt cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt runs in a small thread pool (it releases the GIL) so it never blocks the
+# event loop. Once PASSWORD_HASH_QUEUE_LIMIT jobs are waiting, callers get a 503.
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", 32))
+password_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_hash_jobs = 0
 security = HTTPBearer()
 
-# Create uploads directory
+# Users resolved from tokens are cached per subject (email) for AUTH_USER_CACHE_TTL
+# seconds. Tokens younger than AUTH_TRUST_CLAIMS_SECONDS skip the lookup entirely
+# and the user is built from the token's signed claims (0 disables this). The
+# cache's hit and miss counts are logged every AUTH_USER_CACHE_STATS_SECONDS
+# (0 disables this).
+AUTH_USER_CACHE_TTL = float(os.environ.get("AUTH_USER_CACHE_TTL", 60))
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", 10000))
+AUTH_TRUST_CLAIMS_SECONDS = int(os.environ.get("AUTH_TRUST_CLAIMS_SECONDS", 0))
+AUTH_USER_CACHE_STATS_SECONDS = float(os.environ.get("AUTH_USER_CACHE_STATS_SECONDS", 300))
+
+# Create uploads directory. Audio is stored by content, see store_blob.
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Uploads are copied to disk in chunks of this size so memory stays bounded
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+AUDIO_EXTENSIONS = ['mp3', 'wav', 'ogg']
+
+# Resumable upload sessions keep their partial data here until completed or expired
+UPLOAD_SESSION_DIR = ROOT_DIR / "upload_sessions"
+UPLOAD_SESSION_DIR.mkdir(exist_ok=True)
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
+# Largest audio file accepted, and largest chunk a numbered chunk upload may use
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 2 * 1024 ** 3))
+MAX_UPLOAD_CHUNK_SIZE = int(os.environ.get("MAX_UPLOAD_CHUNK_SIZE", 64 * 1024 * 1024))
+
+# Processes used for background work on uploaded audio
+MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", 2))
+HLS_SEGMENT_SECONDS = float(os.environ.get("HLS_SEGMENT_SECONDS", 6))
+PEAKS_PER_SECOND = int(os.environ.get("PEAKS_PER_SECOND", 100))
+PEAKS_LEVELS = int(os.environ.get("PEAKS_LEVELS", 4))
+
+# Where audio files live. They are stored on local disk unless AUDIO_STORAGE_URL
+# is "s3://bucket/prefix"; S3_ENDPOINT_URL selects an S3-compatible store such as
+# MinIO. With S3, clients upload and download through presigned URLs valid for
+# STORAGE_PRESIGN_SECONDS, and small derived files are cached in STORAGE_CACHE_DIR.
+AUDIO_STORAGE_URL = os.environ.get("AUDIO_STORAGE_URL")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+STORAGE_PRESIGN_SECONDS = int(os.environ.get("STORAGE_PRESIGN_SECONDS", 3600))
+STORAGE_CACHE_DIR = ROOT_DIR / "storage_cache"
+
+# Audio delivery. Uploaded files never change, so they may be cached for a year.
+# When AUDIO_ACCEL_REDIRECT is set (e.g. "/internal/uploads/") nginx serves the
+# bytes from its matching internal location instead of Python.
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+AUDIO_ACCEL_REDIRECT = os.environ.get("AUDIO_ACCEL_REDIRECT")
+AUDIO_SEND_CHUNK_SIZE = 256 * 1024
+AUDIO_MAX_RANGES = 16
+
+# Absolute URL of the site for links that must be absolute, such as feed
+# enclosures. Defaults to the base URL of the request.
+PUBLIC_URL = os.environ.get("PUBLIC_URL", "").rstrip("/")
+
+# Play events are counted in memory per episode and EVENT_BUCKET_SECONDS bucket,
+# then written behind every EVENT_FLUSH_SECONDS with one bulk_write. Events are
+# refused with a 503 while EVENT_BUFFER_LIMIT counters are waiting to be written.
+# A request carries at most EVENT_BATCH_LIMIT events, for an episode that exists;
+# the EVENT_KNOWN_EPISODES most recently seen episode ids are remembered.
+EVENT_BUCKET_SECONDS = int(os.environ.get("EVENT_BUCKET_SECONDS", 3600))
+EVENT_FLUSH_SECONDS = float(os.environ.get("EVENT_FLUSH_SECONDS", 5))
+EVENT_BUFFER_LIMIT = int(os.environ.get("EVENT_BUFFER_LIMIT", 100000))
+EVENT_BATCH_LIMIT = int(os.environ.get("EVENT_BATCH_LIMIT", 100))
+EVENT_KNOWN_EPISODES = int(os.environ.get("EVENT_KNOWN_EPISODES", 100000))
+
+# Trending scores halve every TRENDING_HALF_LIFE_HOURS. They are checkpointed to
+# Mongo every TRENDING_CHECKPOINT_SECONDS, and items whose score decays below
+# TRENDING_MIN_SCORE (about that many recent plays) are forgotten.
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", 24))
+TRENDING_CHECKPOINT_SECONDS = float(os.environ.get("TRENDING_CHECKPOINT_SECONDS", 60))
+TRENDING_MIN_SCORE = float(os.environ.get("TRENDING_MIN_SCORE", 0.01))
+
+# Playback positions are kept in memory per user and episode, and changed ones
+# are written every PROGRESS_FLUSH_SECONDS with one bulk_write. Up to
+# PROGRESS_CACHE_SIZE positions stay in memory to answer reads.
+PROGRESS_FLUSH_SECONDS = float(os.environ.get("PROGRESS_FLUSH_SECONDS", 5))
+PROGRESS_CACHE_SIZE = int(os.environ.get("PROGRESS_CACHE_SIZE", 100000))
+
+# New episodes are copied into each subscriber's inbox when they are created,
+# INBOX_FANOUT_BATCH inboxes per insert. Podcasts with more than
+# INBOX_FANOUT_LIMIT subscribers are skipped and read from the episodes
+# collection instead. INBOX_BACKFILL episodes are added on subscribing.
+INBOX_FANOUT_LIMIT = int(os.environ.get("INBOX_FANOUT_LIMIT", 10000))
+INBOX_FANOUT_BATCH = int(os.environ.get("INBOX_FANOUT_BATCH", 1000))
+INBOX_BACKFILL = int(os.environ.get("INBOX_BACKFILL", 10))
+
+# /api/events/stream pushes podcast_created and episode_created events to
+# browsers. With STREAM_FANOUT=local each worker streams the writes it handles
+# itself; with STREAM_FANOUT=mongo every worker follows a change stream (which
+# needs a replica set) and so streams all writes. A client more than
+# STREAM_QUEUE_SIZE events behind is disconnected, and idle connections get a
+# comment every STREAM_HEARTBEAT_SECONDS so proxies keep them open. Streams end
+# after STREAM_MAX_SECONDS (the browser reconnects) so that they spread over
+# new workers and do not hold up a graceful shutdown.
+STREAM_FANOUT = os.environ.get("STREAM_FANOUT", "local")
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 100))
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("STREAM_HEARTBEAT_SECONDS", 15))
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", 10000))
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", 300))
+
+# Sizes of the lists on the discover page
+DISCOVER_EPISODES = int(os.environ.get("DISCOVER_EPISODES", 10))
+DISCOVER_PODCASTS_PER_CATEGORY = int(os.environ.get("DISCOVER_PODCASTS_PER_CATEGORY", 12))
+
+# List endpoints return pages of this many documents, newest first
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 200))
+
+# Encode list pages straight from the projected Mongo documents instead of
+# validating each one into a model first. The output is byte-identical.
+FAST_JSON = os.environ.get("FAST_JSON", "true").lower() not in ("0", "false", "no")
+
+# Catalog responses are cached until a write bumps one of the generations they
+# depend on. The cache lives in process memory unless RESPONSE_CACHE_URL points
+# at a Redis-compatible server shared by all workers. In memory, generations
+# only see this process's writes, so cached responses and ETags also expire
+# after RESPONSE_CACHE_TTL seconds; the maintenance commands below (which run in
+# their own process) reach running servers only through Redis or that expiry.
+RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL")
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1000))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+RESPONSE_CACHE_GZIP_MIN_SIZE = int(os.environ.get("RESPONSE_CACHE_GZIP_MIN_SIZE", 1024))
+
+# Each client (the token's subject, else the client address) has a token bucket
+# refilled at RATE_LIMIT_RATE tokens per second up to RATE_LIMIT_BURST; requests
+# cost the weights in RATE_LIMIT_ROUTES, 1 otherwise, and get a 429 when the
+# bucket runs dry. Buckets live in process memory (the RATE_LIMIT_CLIENTS most
+# recent clients) unless RATE_LIMIT_URL points at a Redis-compatible server
+# shared by all workers. At most EXPENSIVE_REQUEST_LIMIT expensive requests run
+# at once per worker, the rest get a 503. RATE_LIMIT_RATE=0 disables the buckets.
+RATE_LIMIT_URL = os.environ.get("RATE_LIMIT_URL")
+RATE_LIMIT_RATE = float(os.environ.get("RATE_LIMIT_RATE", 10))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", 100))
+RATE_LIMIT_CLIENTS = int(os.environ.get("RATE_LIMIT_CLIENTS", 100000))
+EXPENSIVE_REQUEST_LIMIT = int(os.environ.get("EXPENSIVE_REQUEST_LIMIT", 64))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -47,9 +276,6 @@ async def ping():
         return {"message": "MongoDB connection successful!"}
     except Exception as e:
         return {"error": str(e)}
-# Mount static files for serving audio
-app.mount("/api/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -100,18 +326,115 @@ class Episode(BaseModel):
     description: str
     audio_file: str
     duration: Optional[int] = None  # in seconds
+    size: Optional[int] = None  # in bytes
+    sha256: Optional[str] = None
+    bitrate: Optional[int] = None  # in bits per second
+    sample_rate: Optional[int] = None  # in Hz
+    channels: Optional[int] = None
+    hls: bool = False  # segments are served under /api/episodes/{id}/hls/
+    peaks: bool = False  # waveform is served by /api/episodes/{id}/peaks
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class EpisodeCreate(BaseModel):
     title: str
     description: str
 
+class UploadSessionCreate(BaseModel):
+    title: str
+    description: str
+    filename: str
+    size: int = Field(..., gt=0, le=MAX_UPLOAD_SIZE)  # total bytes of the audio file
+    chunk_size: int = Field(8 * 1024 * 1024, gt=0, le=MAX_UPLOAD_CHUNK_SIZE)  # used by numbered chunk uploads
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")  # verified on completion when given
+
+class PlayEvent(BaseModel):
+    type: Literal["play", "progress", "complete"]
+    listened: float = Field(0, ge=0, le=3600)  # seconds played since the previous event
+
+class EpisodeStatsBucket(BaseModel):
+    bucket: datetime  # start of the bucket
+    plays: int = 0
+    progress: int = 0
+    completes: int = 0
+    listened: float = 0  # seconds
+
+class EpisodeStats(BaseModel):
+    episode_id: str
+    plays: int = 0
+    progress: int = 0
+    completes: int = 0
+    listened: float = 0
+    buckets: List[EpisodeStatsBucket]
+
+class TrendingPodcast(Podcast):
+    score: float  # decayed play count
+
+class TrendingEpisode(Episode):
+    score: float
+
+class ProgressUpdate(BaseModel):
+    position: float = Field(..., ge=0)  # in seconds
+    completed: bool = False
+    updated_at: Optional[datetime] = None  # when the device recorded it, defaults to now
+
+class PlaybackProgress(BaseModel):
+    episode_id: str
+    position: float
+    completed: bool = False
+    updated_at: datetime
+
+class Subscription(BaseModel):
+    podcast_id: str
+    created_at: datetime
+
+class PodcastWithEpisodes(Podcast):
+    episodes: List[Episode]  # the newest ones
+
+class DiscoverCategory(BaseModel):
+    category: str
+    count: int  # podcasts in the category
+    podcasts: List[Podcast]  # the newest ones
+
+class Discover(BaseModel):
+    latest_episodes: List[Episode]
+    categories: List[DiscoverCategory]
+    podcast_count: int
+    episode_count: int
+
+class UploadSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    podcast_id: str
+    creator_id: str
+    title: str
+    description: str
+    filename: str
+    size: int
+    chunk_size: int
+    sha256: Optional[str] = None
+    received: List[List[int]] = []  # merged [start, end) byte ranges on disk
+    upload_url: Optional[str] = None  # when set, PUT the whole file here instead
+    upload_headers: dict = {}  # headers to send with that PUT
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime
+
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def run_password_job(func, *args):
+    global password_hash_jobs
+    if password_hash_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again",
+                            headers={"Retry-After": "1"})
+    password_hash_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_hash_pool, func, *args)
+    finally:
+        password_hash_jobs -= 1
+
+async def verify_password(plain_password, hashed_password):
+    """Return (valid, new_hash), where new_hash is set if the hash needs upgrading."""
+    return await run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await run_password_job(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -123,6 +446,554 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def save_upload(upload: UploadFile):
+    """Stream an upload to a temporary file in UPLOAD_DIR chunk by chunk.
+
+    Returns the file's path, size and sha256, ready to be passed to store_blob.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = UPLOAD_DIR / f".{uuid.uuid4().hex}.part"
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail="File too large")
+                await f.write(chunk)
+            await f.flush()
+            await asyncio.to_thread(os.fsync, f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def audio_extension(filename: str) -> str:
+    file_extension = filename.split('.')[-1]
+    if file_extension.lower() not in AUDIO_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Only MP3, WAV, and OGG files are supported")
+    return file_extension
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def parse_range_header(range_header: str, size: int):
+    """Return the [start, end] byte ranges requested by ``range_header``.
+
+    None means the header should be ignored and the whole file sent. Raises a
+    416 when the header is valid but none of its ranges can be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    for part in spec.split(","):
+        # ASCII digits only: headers are decoded as latin-1, where int() accepts more
+        if not re.fullmatch(r"[0-9]*-[0-9]*", part.strip()):
+            return None
+        start, _, end = part.strip().partition("-")
+        if not (start or end):
+            return None
+        if not start:
+            # Suffix range: the last N bytes, unsatisfiable for an empty file
+            if int(end) == 0 or size == 0:
+                continue
+            ranges.append([max(size - int(end), 0), size - 1])
+        elif int(start) < size:
+            if end and int(end) < int(start):
+                return None
+            ranges.append([int(start), min(int(end), size - 1) if end else size - 1])
+    if not ranges:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    ranges = [[start, end - 1] for start, end in merge_ranges([start, end + 1] for start, end in ranges)]
+    if len(ranges) > AUDIO_MAX_RANGES:
+        return None
+    return ranges
+
+class AudioFileResponse(Response):
+    """Send whole files, single ranges or multipart/byteranges from disk.
+
+    Uses the ASGI zero-copy send extension when the server offers it and falls
+    back to reading the file in a worker thread otherwise.
+    """
+
+    def __init__(self, path: Path, size: int, ranges, headers: dict, media_type: str, send_body: bool = True):
+        super().__init__(status_code=206 if ranges else 200, headers=headers)
+        self.path = path
+        self.send_body = send_body
+        self.parts = []
+        if not ranges:
+            self.parts.append((b"", 0, size))
+            self.headers["content-type"] = media_type
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.parts.append((b"", start, end + 1 - start))
+            self.headers["content-type"] = media_type
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        else:
+            boundary = uuid.uuid4().hex
+            for start, end in ranges:
+                part_header = (f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                               f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n")
+                self.parts.append(((b"\r\n" if self.parts else b"") + part_header.encode(), start, end + 1 - start))
+            self.trailer = f"\r\n--{boundary}--\r\n".encode()
+            self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        content_length = sum(len(prefix) + count for prefix, _, count in self.parts)
+        self.headers["content-length"] = str(content_length + len(getattr(self, "trailer", b"")))
+
+    async def send_file(self, scope, send):
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        with open(self.path, 'rb') as f:
+            for prefix, offset, count in self.parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zerocopy:
+                    await send({"type": "http.response.zerocopysend", "file": f,
+                                "offset": offset, "count": count, "more_body": True})
+                    continue
+                while count > 0:
+                    chunk = await anyio.to_thread.run_sync(
+                        os.pread, f.fileno(), min(count, AUDIO_SEND_CHUNK_SIZE), offset
+                    )
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    count -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": getattr(self, "trailer", b""), "more_body": False})
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async def listen_for_disconnect(task_group):
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            task_group.cancel_scope.cancel()
+
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(listen_for_disconnect, task_group)
+            await self.send_file(scope, send)
+            task_group.cancel_scope.cancel()
+
+def audio_response(request: Request, relative_path: str, etag: Optional[str] = None) -> Response:
+    upload_root = UPLOAD_DIR.resolve()
+    path = (upload_root / relative_path).resolve()
+    if not path.is_relative_to(upload_root) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    
+    if AUDIO_ACCEL_REDIRECT:
+        # nginx handles ranges and conditional requests for the internal location
+        return Response(headers={
+            "X-Accel-Redirect": AUDIO_ACCEL_REDIRECT + quote(path.relative_to(upload_root).as_posix()),
+            "Content-Type": media_type,
+            "Cache-Control": AUDIO_CACHE_CONTROL,
+        })
+    
+    stat = path.stat()
+    etag = f'"{etag}"' if etag else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": AUDIO_CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since:
+        try:
+            if int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        ranges = parse_range_header(range_header, stat.st_size)
+    return AudioFileResponse(path, stat.st_size, ranges, headers, media_type,
+                             send_body=request.method != "HEAD")
+
+class PageParams:
+    """Query parameters shared by the paginated list endpoints."""
+
+    def __init__(
+        self,
+        request: Request,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    ):
+        self.request = request
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), doc["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def dump_json(content) -> bytes:
+    """Encode ``content`` exactly as FastAPI's JSONResponse would."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":"), default=datetime.isoformat).encode("utf-8")
+
+def model_defaults(model, names):
+    return {name: None if model.model_fields[name].is_required() or model.model_fields[name].default_factory
+            else model.model_fields[name].default for name in names}
+
+def page_projection(model, page: PageParams):
+    """Return the projection for a page of ``model`` and the field names it returns."""
+    projection = {"_id": 0}
+    names = list(model.model_fields)
+    if page.fields:
+        unknown = set(page.fields) - set(model.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        names = [name for name in names if name in ("id", "created_at", *page.fields)]
+        projection.update({name: 1 for name in names})
+    elif FAST_JSON:
+        projection.update({name: 1 for name in names})
+    return projection, names
+
+def page_query(query: dict, page: PageParams) -> dict:
+    if not page.cursor:
+        return query
+    created_at, last_id = decode_cursor(page.cursor)
+    return {"$and": [query, {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": last_id}},
+    ]}]}
+
+def page_headers(docs: list, page: PageParams):
+    """Trim the extra document fetched past the page and return the paging headers."""
+    headers = {}
+    if len(docs) > page.limit:
+        del docs[page.limit:]
+        next_cursor = encode_cursor(docs[-1])
+        headers["X-Next-Cursor"] = next_cursor
+        next_url = page.request.url.include_query_params(cursor=next_cursor)
+        headers["Link"] = f'<{next_url.path}?{next_url.query}>; rel="next"'
+    return headers
+
+async def paginate(collection, query: dict, model, page: PageParams) -> Response:
+    """Return one page of ``collection`` ordered by (created_at, id), newest first.
+
+    The cursor for the following page is sent in the X-Next-Cursor and Link
+    headers so the response body stays a plain list.
+    """
+    projection, names = page_projection(model, page)
+    docs = await collection.find(page_query(query, page), projection).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(page.limit + 1).to_list(page.limit + 1)
+    
+    return page_response(docs, model, names, page, page_headers(docs, page))
+
+def page_response(docs: list, model, names: list, page: PageParams, headers: dict) -> Response:
+    if FAST_JSON:
+        defaults = model_defaults(model, names)
+        body = dump_json([{name: doc.get(name, defaults[name]) for name in names} for doc in docs])
+        return Response(body, media_type="application/json", headers=headers)
+    if not page.fields:
+        docs = [model(**doc) for doc in docs]
+    return JSONResponse(jsonable_encoder(docs), headers=headers)
+
+async def paginate_podcasts_with_episodes(query: dict, page: PageParams, episodes_limit: int) -> Response:
+    """Like paginate() for podcasts, with each one's newest episodes embedded.
+
+    The episodes come from a $lookup in the same aggregation, which uses the
+    podcast_id_created_at_id index once per podcast, so a page costs a single
+    round trip however many podcasts it holds.
+    """
+    projection, names = page_projection(Podcast, page)
+    if len(projection) > 1:
+        projection["episodes"] = 1
+    docs = await db.podcasts.aggregate([
+        {"$match": page_query(query, page)},
+        {"$sort": {"created_at": -1, "id": -1}},
+        {"$limit": page.limit + 1},
+        {"$lookup": {
+            "from": "episodes",
+            # let + $expr rather than localField with a pipeline, which needs MongoDB 5.0
+            "let": {"podcast_id": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$podcast_id", "$$podcast_id"]}}},
+                {"$sort": {"created_at": -1, "id": -1}},
+                {"$limit": episodes_limit},
+                {"$project": {"_id": 0}},
+            ],
+            "as": "episodes",
+        }},
+        {"$project": projection},
+    ]).to_list(page.limit + 1)
+    
+    headers = page_headers(docs, page)
+    if FAST_JSON:
+        defaults = model_defaults(Podcast, names)
+        episode_names = list(Episode.model_fields)
+        episode_defaults = model_defaults(Episode, episode_names)
+        body = dump_json([{
+            **{name: doc.get(name, defaults[name]) for name in names},
+            "episodes": [{name: episode.get(name, episode_defaults[name]) for name in episode_names}
+                         for episode in doc["episodes"]],
+        } for doc in docs])
+        return Response(body, media_type="application/json", headers=headers)
+    if not page.fields:
+        docs = [PodcastWithEpisodes(**doc) for doc in docs]
+    return JSONResponse(jsonable_encoder(docs), headers=headers)
+
+class UserCache:
+    """TTL + LRU cache of authenticated users keyed by token subject."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # subject -> (expires_at, user)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[User]:
+        entry = self.entries.get(subject)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[subject]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(subject)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, subject: str, user: User):
+        self.entries[subject] = (time.monotonic() + self.ttl, user)
+        self.entries.move_to_end(subject)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, subject: str):
+        self.entries.pop(subject, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+user_cache = UserCache(AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_SIZE)
+
+async def log_user_cache_stats(interval: float):
+    logged = 0
+    while True:
+        await asyncio.sleep(interval)
+        stats = user_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        if lookups == logged:
+            continue  # nothing new since the last line
+        logged = lookups
+        logger.info(f"User cache: {stats['hits']} hits, {stats['misses']} misses "
+                    f"({stats['hits'] / lookups:.0%} hit rate), {stats['size']} entries")
+
+def user_from_claims(payload: dict) -> Optional[User]:
+    issued_at = payload.get("iat")
+    if not AUTH_TRUST_CLAIMS_SECONDS or issued_at is None or "uid" not in payload:
+        return None
+    if time.time() - issued_at > AUTH_TRUST_CLAIMS_SECONDS:
+        return None
+    return User(
+        id=payload["uid"],
+        email=payload["sub"],
+        username=payload["username"],
+        role=payload["role"],
+        password_hash="",
+        created_at=payload["created_at"]
+    )
+
+class CachedResponse(BaseModel):
+    body: bytes
+    gzip_body: Optional[bytes] = None
+    media_type: str
+    headers: dict = {}
+
+class MemoryCacheBackend:
+    """Per-process LRU of cached responses plus generation counters."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generation_counters = {}
+        # Counters restart at 0 with the process, so keys and ETags made by an
+        # earlier process (or another worker) must never match this one's
+        self.seed = uuid.uuid4().hex
+
+    def epoch(self) -> str:
+        return f"{self.seed}.{int(time.time() // self.ttl)}"
+
+    async def generations(self, names: List[str]) -> List[int]:
+        return [self.generation_counters.get(name, 0) for name in names]
+
+    async def bump(self, names: List[str]):
+        for name in names:
+            self.generation_counters[name] = self.generation_counters.get(name, 0) + 1
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+class RedisCacheBackend:
+    """Cached responses and generations in Redis, shared by every worker.
+
+    Redis errors are logged and treated as cache misses.
+    """
+
+    prefix = "podcasthub:"
+
+    def epoch(self) -> str:
+        return "redis"
+
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.errors = redis.RedisError
+        self.ttl = ttl
+
+    async def generations(self, names: List[str]) -> Optional[List[int]]:
+        try:
+            values = await self.redis.mget([f"{self.prefix}gen:{name}" for name in names])
+        except self.errors as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return None
+        return [int(value or 0) for value in values]
+
+    async def bump(self, names: List[str]):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for name in names:
+                    pipe.incr(f"{self.prefix}gen:{name}")
+                await pipe.execute()
+        except self.errors as e:
+            logger.warning(f"Response cache unavailable: {e}")
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            value = await self.redis.hgetall(f"{self.prefix}response:{key}")
+        except self.errors as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return None
+        if not value:
+            return None
+        return CachedResponse(body=value[b"body"], gzip_body=value.get(b"gzip"), **json.loads(value[b"meta"]))
+
+    async def set(self, key: str, entry: CachedResponse):
+        fields = {
+            "body": entry.body,
+            "meta": json.dumps({"media_type": entry.media_type, "headers": entry.headers}),
+        }
+        if entry.gzip_body is not None:
+            fields["gzip"] = entry.gzip_body
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(f"{self.prefix}response:{key}", mapping=fields)
+                pipe.expire(f"{self.prefix}response:{key}", self.ttl)
+                await pipe.execute()
+        except self.errors as e:
+            logger.warning(f"Response cache unavailable: {e}")
+
+if RESPONSE_CACHE_URL:
+    response_cache = RedisCacheBackend(RESPONSE_CACHE_URL, RESPONSE_CACHE_TTL)
+else:
+    response_cache = MemoryCacheBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+async def cached_response(request: Request, generations: List[str], build) -> Response:
+    """Serve ``build()``'s response from the response cache.
+
+    The cache key and ETag include the current value of every generation the
+    response depends on, so bumping one (see the write hooks) invalidates all
+    of its cached responses at once and a matching If-None-Match gets a 304
+    without touching Mongo.
+    """
+    values = await response_cache.generations(generations)
+    if values is None:
+        return await build()
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    key = f"{response_cache.epoch()}|{request.url.netloc}{request.url.path}?{query}|" + ",".join(
+        f"{n}={v}" for n, v in zip(generations, values)
+    )
+    etag = '"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    entry = await response_cache.get(key)
+    if entry is None:
+        response = await build()
+        if response.status_code != 200:
+            return response
+        entry = CachedResponse(
+            body=response.body,
+            media_type=response.media_type,
+            headers={k: v for k, v in response.headers.items() if k in ("x-next-cursor", "link", "last-modified")}
+        )
+        if RESPONSE_CACHE_GZIP_MIN_SIZE and len(entry.body) >= RESPONSE_CACHE_GZIP_MIN_SIZE:
+            entry.gzip_body = gzip.compress(entry.body, compresslevel=6)
+        await response_cache.set(key, entry)
+    
+    headers.update(entry.headers)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is None and if_modified_since and "last-modified" in entry.headers:
+        try:
+            if parsedate_to_datetime(entry.headers["last-modified"]) <= parsedate_to_datetime(if_modified_since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    if entry.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzip_body, media_type=entry.media_type, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
@@ -132,10 +1003,655 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
+    user = user_from_claims(payload) or user_cache.get(email)
+    if user is not None:
+        return user
+    
     user = await db.users.find_one({"email": email})
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+    user = User(**user)
+    user_cache.put(email, user)
+    return user
+
+class SuggestionIndex:
+    """In-memory prefix index for search-as-you-type.
+
+    Every word-suffix of a normalized title is kept in one sorted list, so a
+    prefix lookup is a binary search followed by a short scan, and a title
+    matches whichever of its words the user starts typing.
+    """
+
+    MAX_WORDS = 8  # only index suffixes starting in the first few words
+
+    def __init__(self):
+        self.keys = []  # sorted (key, kind, id)
+        self.entries = {}  # (kind, id) -> suggestion
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(re.sub(r"[\W_]+", " ", text.casefold()).split())
+
+    def suggestion_keys(self, kind: str, item_id: str, text: str):
+        words = self.normalize(text).split()
+        return [(" ".join(words[i:]), kind, item_id) for i in range(min(len(words), self.MAX_WORDS))]
+
+    def add(self, kind: str, item_id: str, text: str, **extra):
+        if (kind, item_id) in self.entries:
+            return
+        self.entries[(kind, item_id)] = {"type": kind, "id": item_id, "text": text, **extra}
+        for key in self.suggestion_keys(kind, item_id, text):
+            bisect.insort(self.keys, key)
+
+    def load(self, items):
+        """Rebuild the index from ``items`` of (kind, id, text, extra) with one sort."""
+        entries, keys = {}, []
+        for kind, item_id, text, extra in items:
+            if (kind, item_id) not in entries:
+                entries[(kind, item_id)] = {"type": kind, "id": item_id, "text": text, **extra}
+                keys.extend(self.suggestion_keys(kind, item_id, text))
+        # Keep anything added while the items were being read
+        for (kind, item_id), entry in self.entries.items():
+            if (kind, item_id) not in entries:
+                entries[(kind, item_id)] = entry
+                keys.extend(self.suggestion_keys(kind, item_id, entry["text"]))
+        keys.sort()
+        self.entries, self.keys = entries, keys
+
+    def add_podcast(self, podcast: dict):
+        self.add("podcast", podcast["id"], podcast["title"])
+        self.add("category", podcast["category"], podcast["category"])
+
+    def add_episode(self, episode: dict):
+        self.add("episode", episode["id"], episode["title"], podcast_id=episode["podcast_id"])
+
+    def suggest(self, prefix: str, limit: int):
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        keys = self.keys
+        i = bisect.bisect_left(keys, (prefix,))
+        while i < len(keys) and len(results) < limit and keys[i][0].startswith(prefix):
+            entry = keys[i][1:]
+            if entry not in seen:
+                seen.add(entry)
+                results.append(self.entries[entry])
+            i += 1
+        return results
+
+suggestions = SuggestionIndex()
+
+async def load_suggestions():
+    items = []
+    async for podcast in db.podcasts.find({}, {"_id": 0, "id": 1, "title": 1, "category": 1}):
+        items.append(("podcast", podcast["id"], podcast["title"], {}))
+        items.append(("category", podcast["category"], podcast["category"], {}))
+    async for episode in db.episodes.find({}, {"_id": 0, "id": 1, "title": 1, "podcast_id": 1}):
+        items.append(("episode", episode["id"], episode["title"], {"podcast_id": episode["podcast_id"]}))
+    suggestions.load(items)
+    logger.info(f"Loaded {len(suggestions.entries)} search suggestions")
+
+# Audio metadata
+#
+# Durations are worked out from container and frame headers alone, so probing
+# reads a few kilobytes from each end of the file instead of decoding it.
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+def parse_mp3_frame_header(header: bytes):
+    """Return the fields of an MPEG audio frame header, or None if it is not one."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = {0: 2.5, 2: 2, 3: 1}.get((header[1] >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 1
+    channels = 1 if header[3] >> 6 == 3 else 2
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 576 if layer == 3 and version != 1 else 1152
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {"version": version, "layer": layer, "bitrate": bitrate, "sample_rate": sample_rate,
+            "channels": channels, "samples": samples, "length": length}
+
+def find_mp3_frame(data: bytes, start: int = 0):
+    """Return (offset, header) of the first frame in ``data`` followed by another."""
+    offset = data.find(b"\xff", start)
+    while 0 <= offset < len(data) - 4:
+        header = parse_mp3_frame_header(data[offset:offset + 4])
+        if header:
+            following = data[offset + header["length"]:offset + header["length"] + 4]
+            if len(following) < 4 or parse_mp3_frame_header(following):
+                return offset, header
+        offset = data.find(b"\xff", offset + 1)
+    return None, None
+
+def probe_mp3(f, size: int):
+    head = f.read(10)
+    start = 0
+    if head[:3] == b"ID3":
+        start = 10 + ((head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | head[9] & 0x7F)
+        if head[5] & 0x10:
+            start += 10  # footer
+    f.seek(start)
+    data = f.read(64 * 1024)
+    offset, header = find_mp3_frame(data)
+    if header is None:
+        return None
+    
+    audio_size = size - start - offset
+    f.seek(max(size - 128, 0))
+    if f.read(3) == b"TAG":
+        audio_size -= 128
+    
+    # A Xing/Info or VBRI tag in the first frame gives the exact frame count
+    frames = None
+    if header["version"] == 1:
+        side_info = 17 if header["channels"] == 1 else 32
+    else:
+        side_info = 9 if header["channels"] == 1 else 17
+    xing = offset + 4 + side_info
+    vbri = offset + 4 + 32
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+        if flags & 1:
+            frames = int.from_bytes(data[xing + 8:xing + 12], "big")
+        if flags & 2:
+            audio_size = int.from_bytes(data[xing + 12 if flags & 1 else xing + 8:][:4], "big") or audio_size
+    elif data[vbri:vbri + 4] == b"VBRI":
+        audio_size = int.from_bytes(data[vbri + 10:vbri + 14], "big") or audio_size
+        frames = int.from_bytes(data[vbri + 14:vbri + 18], "big")
+    
+    if frames:
+        duration = frames * header["samples"] / header["sample_rate"]
+        bitrate = int(audio_size * 8 / duration) if duration else header["bitrate"]
+    else:
+        duration = audio_size * 8 / header["bitrate"]
+        bitrate = header["bitrate"]
+    return {"duration": duration, "bitrate": bitrate,
+            "sample_rate": header["sample_rate"], "channels": header["channels"]}
+
+def wav_layout(f, size: int):
+    """Return the fmt fields and the data chunk's offset and size of a WAV file."""
+    header = f.read(12)
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, chunk_size = chunk[:4], int.from_bytes(chunk[4:8], "little")
+        if chunk_id == b"fmt ":
+            data = f.read(chunk_size + chunk_size % 2)
+            fmt = {"format": int.from_bytes(data[0:2], "little"),
+                   "channels": int.from_bytes(data[2:4], "little"),
+                   "sample_rate": int.from_bytes(data[4:8], "little"),
+                   "byte_rate": int.from_bytes(data[8:12], "little"),
+                   "bits_per_sample": int.from_bytes(data[14:16], "little")}
+            if fmt["format"] == 0xFFFE and len(data) >= 26:
+                # WAVE_FORMAT_EXTENSIBLE keeps the real format in its sub-format GUID
+                fmt["format"] = int.from_bytes(data[24:26], "little")
+        elif chunk_id == b"data":
+            if fmt is None or not fmt["byte_rate"]:
+                return None
+            # Streaming writers leave the size unset; trust the file instead
+            return {**fmt, "data_offset": f.tell(), "data_size": min(chunk_size, size - f.tell())}
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+def probe_wav(f, size: int):
+    layout = wav_layout(f, size)
+    if layout is None:
+        return None
+    return {"duration": layout["data_size"] / layout["byte_rate"], "bitrate": layout["byte_rate"] * 8,
+            "sample_rate": layout["sample_rate"], "channels": layout["channels"]}
+
+def probe_ogg(f, size: int):
+    page = f.read(27)
+    if page[:4] != b"OggS":
+        return None
+    serial = page[14:18]
+    segments = f.read(page[26])
+    packet = f.read(sum(segments))
+    if packet[:7] == b"\x01vorbis":
+        channels, sample_rate = packet[11], int.from_bytes(packet[12:16], "little")
+        rate, pre_skip = sample_rate, 0
+    elif packet[:8] == b"OpusHead":
+        channels, sample_rate = packet[9], int.from_bytes(packet[12:16], "little")
+        rate, pre_skip = 48000, int.from_bytes(packet[10:12], "little")
+    else:
+        return None
+    
+    # The granule position of the stream's last page is its length in samples
+    f.seek(max(size - 64 * 1024, 0))
+    tail = f.read()
+    granule = None
+    offset = tail.rfind(b"OggS")
+    while offset >= 0 and granule is None:
+        page = tail[offset:offset + 27]
+        if len(page) == 27 and page[14:18] == serial:
+            position = int.from_bytes(page[6:14], "little", signed=True)
+            if position >= 0:
+                granule = position
+        offset = tail.rfind(b"OggS", 0, offset)
+    if granule is None or not rate:
+        return None
+    duration = max(granule - pre_skip, 0) / rate
+    return {"duration": duration, "bitrate": int(size * 8 / duration) if duration else None,
+            "sample_rate": sample_rate, "channels": channels}
+
+def probe_audio(path: str) -> Optional[dict]:
+    """Return duration, bitrate, sample rate and channel count for an audio file."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+        f.seek(0)
+        if magic == b"RIFF":
+            info = probe_wav(f, size)
+        elif magic == b"OggS":
+            info = probe_ogg(f, size)
+        else:
+            info = probe_mp3(f, size)
+    if info is None:
+        return None
+    info["duration"] = round(info["duration"])
+    return info
+
+# HLS packaging
+#
+# MP3 episodes are cut at frame boundaries into segments of about
+# HLS_SEGMENT_SECONDS, written with a VOD playlist to "<audio file>.hls/" next to
+# the original. Each segment starts with the ID3 timestamp tag that HLS packed
+# audio requires.
+def hls_directory(audio_path: Path) -> Path:
+    return audio_path.with_name(audio_path.name + ".hls")
+
+def hls_timestamp_tag(seconds: float) -> bytes:
+    owner = b"com.apple.streaming.transportStreamTimestamp\x00"
+    timestamp = (round(seconds * 90000) & (2 ** 33 - 1)).to_bytes(8, "big")
+    frame = b"PRIV" + syncsafe(len(owner) + 8) + b"\x00\x00" + owner + timestamp
+    return b"ID3\x04\x00\x00" + syncsafe(len(frame)) + frame
+
+def syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+def package_hls(path: str) -> Optional[dict]:
+    audio_path = Path(path)
+    with open(audio_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # PCM and Vorbis data can contain what looks like MP3 frame sync
+        if data[:4] in (b"RIFF", b"OggS"):
+            return None
+        start = 0
+        if data[:3] == b"ID3":
+            start = 10 + ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | data[9] & 0x7F)
+        offset, header = find_mp3_frame(data[start:start + 64 * 1024])
+        if header is None:
+            return None
+        offset += start
+        
+        # Skip a leading Xing/Info/VBRI frame, it carries no audio
+        if any(tag in data[offset:offset + header["length"]] for tag in (b"Xing", b"Info", b"VBRI")):
+            offset += header["length"]
+        
+        # Split the stream into (start offset, end offset, duration) segments
+        segments = []
+        segment_start, segment_duration = offset, 0.0
+        while offset + 4 <= len(data):
+            header = parse_mp3_frame_header(data[offset:offset + 4])
+            if header is None:
+                # Lost sync (e.g. a trailing ID3v1 tag): look for the next frame
+                skip, header = find_mp3_frame(data[offset + 1:offset + 1 + 64 * 1024])
+                if header is None:
+                    break
+                if offset > segment_start:
+                    segments.append((segment_start, offset, segment_duration))
+                offset += 1 + skip
+                segment_start, segment_duration = offset, 0.0
+                continue
+            if offset + header["length"] > len(data):
+                break
+            if segment_duration >= HLS_SEGMENT_SECONDS:
+                segments.append((segment_start, offset, segment_duration))
+                segment_start, segment_duration = offset, 0.0
+            offset += header["length"]
+            segment_duration += header["samples"] / header["sample_rate"]
+        if offset > segment_start:
+            segments.append((segment_start, offset, segment_duration))
+        if not segments:
+            return None
+        
+        # Write to a scratch directory and swap it in once complete
+        output = hls_directory(audio_path)
+        scratch = output.with_name(f".{output.name}.{uuid.uuid4().hex}")
+        scratch.mkdir()
+        try:
+            playlist = [
+                "#EXTM3U",
+                "#EXT-X-VERSION:3",
+                f"#EXT-X-TARGETDURATION:{math.ceil(round(max(duration for _, _, duration in segments), 3))}",
+                "#EXT-X-MEDIA-SEQUENCE:0",
+                "#EXT-X-PLAYLIST-TYPE:VOD",
+            ]
+            elapsed = 0.0
+            for index, (segment_start, segment_end, duration) in enumerate(segments):
+                name = f"segment_{index:05d}.mp3"
+                with open(scratch / name, 'wb') as segment:
+                    segment.write(hls_timestamp_tag(elapsed))
+                    segment.write(data[segment_start:segment_end])
+                playlist += [f"#EXTINF:{duration:.3f},", name]
+                elapsed += duration
+            playlist.append("#EXT-X-ENDLIST")
+            (scratch / "index.m3u8").write_text("\n".join(playlist) + "\n")
+            shutil.rmtree(output, ignore_errors=True)
+            try:
+                os.replace(scratch, output)
+            except OSError:
+                # Another process packaged the same file in between
+                if not output.is_dir():
+                    raise
+                shutil.rmtree(scratch, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+    return {"hls": True}
+
+# Waveform peaks
+#
+# Peaks are min/max pairs of int8 per bucket, stored for PEAKS_LEVELS zoom levels
+# in "<audio file>.peaks". Level 0 has PEAKS_PER_SECOND buckets per second and
+# each further level is 4 times coarser. The file starts with a header:
+#   b"PEAK", version (u8), level count (u8), reserved (u16), sample rate (u32)
+# followed by (samples per bucket, bucket count) as two u32 for every level,
+# then each level's interleaved min/max bytes. All integers are little-endian.
+PEAKS_HEADER = struct.Struct("<4sBBHI")
+PEAKS_LEVEL = struct.Struct("<II")
+PEAKS_ZOOM_FACTOR = 4
+
+def peaks_path(audio_path: Path) -> Path:
+    return audio_path.with_name(audio_path.name + ".peaks")
+
+def wav_pcm_blocks(path: str, block_frames: int):
+    """Yield (sample_rate, float32 frames x channels) blocks of a PCM/float WAV file."""
+    with open(path, 'rb') as f:
+        layout = wav_layout(f, os.path.getsize(path))
+    if layout is None:
+        return
+    bits, channels = layout["bits_per_sample"], layout["channels"]
+    kind = {(1, 8): "u1", (1, 16): "<i2", (1, 24): "u1", (1, 32): "<i4", (3, 32): "<f4", (3, 64): "<f8"}.get(
+        (layout["format"], bits)
+    )
+    if kind is None or not channels:
+        return
+    frame_bytes = bits // 8 * channels
+    frames = layout["data_size"] // frame_bytes
+    samples = np.memmap(path, dtype=kind, mode="r", offset=layout["data_offset"],
+                        shape=(frames, channels * (3 if bits == 24 else 1)))
+    for start in range(0, frames, block_frames):
+        block = np.asarray(samples[start:start + block_frames])
+        if bits == 24:
+            block = block.reshape(len(block), channels, 3).astype(np.int32)
+            block = (block[..., 0] | block[..., 1] << 8 | block[..., 2] << 16) << 8  # sign-extend via int32
+            block = block.astype(np.float32) / 2 ** 31
+        elif bits == 8:
+            block = (block.astype(np.float32) - 128) / 128
+        elif layout["format"] == 1:
+            block = block.astype(np.float32) / 2 ** (bits - 1)
+        yield layout["sample_rate"], block.astype(np.float32, copy=False)
+
+def ffmpeg_pcm_blocks(path: str, block_frames: int, sample_rate: int = 16000):
+    """Yield mono blocks decoded by ffmpeg, for formats numpy cannot read directly."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return
+    process = subprocess.Popen(
+        [ffmpeg, "-v", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"],
+        stdout=subprocess.PIPE
+    )
+    try:
+        while chunk := process.stdout.read(block_frames * 2):
+            block = np.frombuffer(chunk[:len(chunk) // 2 * 2], dtype="<i2")
+            yield sample_rate, (block.astype(np.float32) / 32768).reshape(-1, 1)
+    finally:
+        process.stdout.close()
+        process.wait()
+
+def compute_peaks(path: str) -> Optional[dict]:
+    with open(path, 'rb') as f:
+        is_wav = f.read(4) == b"RIFF"
+    
+    base, sample_rate, carry = None, None, None
+    minima, maxima = [], []
+    
+    def add_buckets(frames, buckets):
+        grouped = frames.reshape(buckets, -1)
+        minima.append(grouped.min(axis=1))
+        maxima.append(grouped.max(axis=1))
+    
+    for rate, block in (wav_pcm_blocks if is_wav else ffmpeg_pcm_blocks)(path, 2 ** 20):
+        if base is None:
+            sample_rate = rate
+            base = max(rate // PEAKS_PER_SECOND, 1)
+        if carry is not None and len(carry):
+            block = np.concatenate((carry, block))
+        # Frames left over after the last whole bucket go into the next block
+        buckets = len(block) // base
+        carry = block[buckets * base:]
+        if buckets:
+            add_buckets(block[:buckets * base], buckets)
+    if base is None:
+        return None
+    if len(carry):
+        add_buckets(carry, 1)
+    
+    level_min = np.floor(np.concatenate(minima) * 127).clip(-127, 127).astype(np.int8)
+    level_max = np.ceil(np.concatenate(maxima) * 127).clip(-127, 127).astype(np.int8)
+    levels = []
+    for level in range(PEAKS_LEVELS):
+        levels.append((base * PEAKS_ZOOM_FACTOR ** level, np.column_stack((level_min, level_max)).ravel()))
+        starts = np.arange(0, len(level_min), PEAKS_ZOOM_FACTOR)
+        level_min = np.minimum.reduceat(level_min, starts)
+        level_max = np.maximum.reduceat(level_max, starts)
+    
+    output = peaks_path(Path(path))
+    scratch = output.with_name(f".{output.name}.{uuid.uuid4().hex}")
+    try:
+        with open(scratch, 'wb') as f:
+            f.write(PEAKS_HEADER.pack(b"PEAK", 1, len(levels), 0, sample_rate))
+            for samples_per_bucket, data in levels:
+                f.write(PEAKS_LEVEL.pack(samples_per_bucket, len(data) // 2))
+            for _, data in levels:
+                f.write(data.tobytes())
+        os.replace(scratch, output)
+    except BaseException:
+        scratch.unlink(missing_ok=True)
+        raise
+    return {"peaks": True}
+
+def read_peaks(path: Path, zoom: int, start: float, end: Optional[float]):
+    """Return (sample rate, samples per bucket, first bucket, bytes) for a time range."""
+    with open(path, 'rb') as f:
+        magic, _, level_count, _, sample_rate = PEAKS_HEADER.unpack(f.read(PEAKS_HEADER.size))
+        if magic != b"PEAK" or not 0 <= zoom < level_count:
+            return None
+        levels = [PEAKS_LEVEL.unpack(f.read(PEAKS_LEVEL.size)) for _ in range(level_count)]
+        samples_per_bucket, count = levels[zoom]
+        # Clamp before converting, huge times overflow to inf
+        duration = count * samples_per_bucket / sample_rate
+        first = int(min(start, duration) * sample_rate // samples_per_bucket)
+        last = count if end is None else min(math.ceil(min(end, duration) * sample_rate / samples_per_bucket), count)
+        offset = f.tell() + 2 * sum(level_count for _, level_count in levels[:zoom])
+        f.seek(offset + 2 * first)
+        return sample_rate, samples_per_bucket, first, f.read(2 * max(last - first, 0))
+
+# Media processing
+#
+# Every stage takes the path of an episode's audio file and returns fields to
+# set on the episode (or None). Stages run one after another in a process pool
+# once the episode has been created, so uploads never wait on them.
+MEDIA_STAGES = [probe_audio, package_hls, compute_peaks]
+media_pool = None
+media_tasks = set()
+media_pending = set()
+
+def get_media_pool():
+    global media_pool
+    if media_pool is None:
+        media_pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return media_pool
+
+def shutdown_media_pool():
+    global media_pool
+    if media_pool is not None:
+        media_pool.shutdown(wait=False, cancel_futures=True)
+        media_pool = None
+
+async def process_episode_media(audio_file: str):
+    """Run the media stages on an audio file and update every episode using it."""
+    loop = asyncio.get_running_loop()
+    updates = {}
+    try:
+        async with storage.local_file(audio_file) as path:
+            for stage in MEDIA_STAGES:
+                try:
+                    result = await loop.run_in_executor(get_media_pool(), stage, str(path))
+                except Exception:
+                    logger.exception(f"Media stage {stage.__name__} failed for {audio_file}")
+                    continue
+                updates.update(result or {})
+            await storage.publish(audio_file, path)
+    finally:
+        # Episodes created after this point are not covered by the update below
+        media_pending.discard(audio_file)
+    if not updates:
+        return
+    await db.episodes.update_many({"audio_file": audio_file}, {"$set": updates})
+    async for episode in db.episodes.find({"audio_file": audio_file}, {"_id": 0, "id": 1, "podcast_id": 1}):
+        await episode_updated(episode["id"], episode["podcast_id"], updates)
+
+def schedule_media_processing(episode: Episode):
+    # Deduplicated uploads share the blob, so one run covers all of them and
+    # two runs never rewrite the same output files at once
+    if episode.audio_file in media_pending:
+        return
+    media_pending.add(episode.audio_file)
+    task = asyncio.create_task(process_episode_media(episode.audio_file))
+    media_tasks.add(task)
+    task.add_done_callback(media_tasks.discard)
+
+async def backfill_media(reprocess: bool = False):
+    query = {} if reprocess else {"duration": None}
+    semaphore = asyncio.Semaphore(MEDIA_WORKERS)
+    
+    async def process(audio_file):
+        async with semaphore:
+            await process_episode_media(audio_file)
+    
+    audio_files = await db.episodes.distinct("audio_file", query)
+    await asyncio.gather(*(process(audio_file) for audio_file in audio_files))
+    return len(audio_files)
+
+# Discover page
+#
+# /api/discover is assembled from a few documents in the "discover" collection
+# which the write hooks keep up to date: the newest episodes, catalog totals,
+# and one bucket per category holding its podcast count and newest podcasts.
+# `python server.py rebuild-discover` recomputes them from the catalog.
+DISCOVER_LATEST_ID = "latest_episodes"
+DISCOVER_TOTALS_ID = "totals"
+
+def discover_bucket_id(category: str) -> str:
+    return f"category:{category}"
+
+async def discover_podcast_added(podcast: dict):
+    await db.discover.update_one(
+        {"_id": discover_bucket_id(podcast["category"])},
+        {
+            "$set": {"category": podcast["category"]},
+            "$inc": {"count": 1},
+            "$push": {"podcasts": {"$each": [podcast], "$position": 0, "$slice": DISCOVER_PODCASTS_PER_CATEGORY}},
+        },
+        upsert=True,
+    )
+    await db.discover.update_one({"_id": DISCOVER_TOTALS_ID}, {"$inc": {"podcasts": 1}}, upsert=True)
+
+async def discover_episode_added(episode: dict):
+    await db.discover.update_one(
+        {"_id": DISCOVER_LATEST_ID},
+        {"$push": {"episodes": {"$each": [episode], "$position": 0, "$slice": DISCOVER_EPISODES}}},
+        upsert=True,
+    )
+    await db.discover.update_one({"_id": DISCOVER_TOTALS_ID}, {"$inc": {"episodes": 1}}, upsert=True)
+
+async def discover_episode_updated(episode_id: str, updates: dict):
+    await db.discover.update_one(
+        {"_id": DISCOVER_LATEST_ID, "episodes.id": episode_id},
+        {"$set": {f"episodes.$.{field}": value for field, value in updates.items()}},
+    )
+
+async def rebuild_discover():
+    buckets = []
+    for category in await db.podcasts.distinct("category"):
+        podcasts = await db.podcasts.find({"category": category}, {"_id": 0}).sort(
+            [("created_at", DESCENDING), ("id", DESCENDING)]
+        ).to_list(DISCOVER_PODCASTS_PER_CATEGORY)
+        count = await db.podcasts.count_documents({"category": category})
+        buckets.append({"_id": discover_bucket_id(category), "category": category, "count": count,
+                        "podcasts": podcasts})
+    episodes = await db.episodes.find({}, {"_id": 0}).sort(
+        [("created_at", DESCENDING), ("id", DESCENDING)]
+    ).to_list(DISCOVER_EPISODES)
+    totals = {
+        "_id": DISCOVER_TOTALS_ID,
+        "podcasts": await db.podcasts.count_documents({}),
+        "episodes": await db.episodes.count_documents({}),
+    }
+    
+    documents = buckets + [{"_id": DISCOVER_LATEST_ID, "episodes": episodes}, totals]
+    for document in documents:
+        await db.discover.replace_one({"_id": document["_id"]}, document, upsert=True)
+    await db.discover.delete_many({"_id": {"$nin": [document["_id"] for document in documents]}})
+    await response_cache.bump(["podcasts", "episodes"])
+    return len(buckets)
+
+async def load_discover():
+    if await db.discover.find_one({"_id": DISCOVER_TOTALS_ID}) is None:
+        categories = await rebuild_discover()
+        logger.info(f"Built the discover page with {categories} categories")
+
+# Write hooks keep state derived from the catalog up to date
+async def podcast_created(podcast: Podcast):
+    suggestions.add_podcast(podcast.dict())
+    live_events.announce("podcast_created", podcast)
+    await discover_podcast_added(podcast.dict())
+    await response_cache.bump(["podcasts"])
+
+async def episode_created(episode: Episode):
+    suggestions.add_episode(episode.dict())
+    await discover_episode_added(episode.dict())
+    await response_cache.bump(["episodes", f"podcast:{episode.podcast_id}"])
+    schedule_inbox_fanout(episode)
+    live_events.announce("episode_created", episode)
+    if episode.duration is None:
+        schedule_media_processing(episode)
+
+async def episode_updated(episode_id: str, podcast_id: str, updates: dict):
+    await discover_episode_updated(episode_id, updates)
+    await response_cache.bump(["episodes", f"podcast:{podcast_id}"])
 
 # Authentication routes
 @api_router.post("/auth/register", response_model=UserResponse)
@@ -146,7 +1662,7 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     user = User(
         email=user_data.email,
         username=user_data.username,
@@ -154,18 +1670,36 @@ async def register(user_data: UserCreate):
         role=user_data.role
     )
     
-    await db.users.insert_one(user.dict())
+    try:
+        await db.users.insert_one(user.dict())
+    except DuplicateKeyError:
+        # Another sign-up with this email got in first
+        raise HTTPException(status_code=400, detail="Email already registered")
     return UserResponse(**user.dict())
 
 @api_router.post("/auth/login")
 async def login(user_data: UserLogin):
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password_hash"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    valid, new_hash = await verify_password(user_data.password, user["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if new_hash:
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": new_hash}})
+        user_cache.invalidate(user["email"])
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"]}, expires_delta=access_token_expires
+        data={
+            "sub": user["email"],
+            "uid": user["id"],
+            "username": user["username"],
+            "role": user["role"],
+            "created_at": user["created_at"].isoformat(),
+            "iat": datetime.utcnow()
+        },
+        expires_delta=access_token_expires
     )
     return {
         "access_token": access_token,
@@ -191,29 +1725,392 @@ async def create_podcast(podcast_data: PodcastCreate, current_user: User = Depen
     )
     
     await db.podcasts.insert_one(podcast.dict())
+    await podcast_created(podcast)
     return podcast
 
-@api_router.get("/podcasts", response_model=List[Podcast])
-async def get_podcasts():
-    podcasts = await db.podcasts.find().to_list(1000)
-    return [Podcast(**podcast) for podcast in podcasts]
+@api_router.get("/podcasts", response_model=Union[List[PodcastWithEpisodes], List[Podcast]])
+async def get_podcasts(
+    request: Request,
+    page: PageParams = Depends(),
+    ids: Optional[str] = Query(None, description="Comma-separated podcast ids to fetch"),
+    category: Optional[str] = Query(None, description="Only podcasts in this category"),
+    include: Optional[str] = Query(None, pattern="^episodes$", description="Embed each podcast's episodes"),
+    episodes_limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+):
+    query = {}
+    if ids is not None:
+        id_list = [podcast_id.strip() for podcast_id in ids.split(",") if podcast_id.strip()]
+        if len(id_list) > MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids may be requested")
+        query["id"] = {"$in": id_list}
+    if category is not None:
+        query["category"] = category
+    if include == "episodes":
+        return await cached_response(
+            request, ["podcasts", "episodes"],
+            lambda: paginate_podcasts_with_episodes(query, page, episodes_limit)
+        )
+    return await cached_response(request, ["podcasts"], lambda: paginate(db.podcasts, query, Podcast, page))
 
-@api_router.get("/podcasts/my", response_model=List[Podcast])
-async def get_my_podcasts(current_user: User = Depends(get_current_user)):
+@api_router.get("/podcasts/my", response_model=Union[List[PodcastWithEpisodes], List[Podcast]])
+async def get_my_podcasts(
+    page: PageParams = Depends(),
+    include: Optional[str] = Query(None, pattern="^episodes$", description="Embed each podcast's episodes"),
+    episodes_limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != "podcaster":
         raise HTTPException(status_code=403, detail="Only podcasters can view their podcasts")
     
-    podcasts = await db.podcasts.find({"creator_id": current_user.id}).to_list(1000)
-    return [Podcast(**podcast) for podcast in podcasts]
+    if include == "episodes":
+        return await paginate_podcasts_with_episodes({"creator_id": current_user.id}, page, episodes_limit)
+    return await paginate(db.podcasts, {"creator_id": current_user.id}, Podcast, page)
 
 @api_router.get("/podcasts/{podcast_id}", response_model=Podcast)
-async def get_podcast(podcast_id: str):
-    podcast = await db.podcasts.find_one({"id": podcast_id})
-    if not podcast:
-        raise HTTPException(status_code=404, detail="Podcast not found")
-    return Podcast(**podcast)
+async def get_podcast(podcast_id: str, request: Request):
+    async def build():
+        podcast = await db.podcasts.find_one({"id": podcast_id})
+        if not podcast:
+            raise HTTPException(status_code=404, detail="Podcast not found")
+        return JSONResponse(jsonable_encoder(Podcast(**podcast)))
+    return await cached_response(request, ["podcasts"], build)
+
+# Content-addressed storage
+#
+# Each distinct audio file is stored once, as UPLOAD_DIR/ab/cd/<sha256>.<ext>,
+# so identical uploads share one copy (and its HLS segments and peaks) and no
+# directory grows large. The "blobs" collection, keyed by sha256, counts the
+# episodes referencing each file.
+MEDIA_FIELDS = ["duration", "bitrate", "sample_rate", "channels", "hls", "peaks"]
+
+class LocalStorage:
+    """Files under UPLOAD_DIR, served by the API itself (or nginx)."""
+
+    presigned = False
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread((UPLOAD_DIR / key).is_file)
+
+    async def put(self, source: Path, key: str):
+        await asyncio.to_thread(place_blob, source, UPLOAD_DIR / key)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(remove_blob_files, UPLOAD_DIR / key)
+
+    @asynccontextmanager
+    async def local_file(self, key: str):
+        yield UPLOAD_DIR / key
+
+    async def publish(self, key: str, path: Path):
+        """Store the HLS segments and peaks generated next to ``path`` under ``key``."""
+        if path != UPLOAD_DIR / key:
+            await asyncio.to_thread(move_blob_sidecars, path, UPLOAD_DIR / key)
+
+    async def cached_file(self, key: str) -> Path:
+        return UPLOAD_DIR / key
+
+class S3Storage:
+    """Files in an S3 bucket or an S3-compatible store.
+
+    Clients PUT and GET audio through presigned URLs, so those bytes never pass
+    through the API. boto3 blocks, so its calls run in threads.
+    """
+
+    presigned = True
+
+    def __init__(self, url: str, endpoint_url: Optional[str], expires: int):
+        import boto3
+        from botocore.exceptions import ClientError
+        parsed = urlparse(url)
+        if parsed.scheme != "s3" or not parsed.netloc:
+            raise ValueError(f"Unsupported AUDIO_STORAGE_URL: {url}")
+        self.bucket = parsed.netloc
+        self.prefix = parsed.path.strip("/") + "/" if parsed.path.strip("/") else ""
+        self.s3 = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client_error = ClientError
+        self.expires = expires
+
+    def object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    async def head(self, key: str) -> Optional[dict]:
+        try:
+            return await asyncio.to_thread(
+                self.s3.head_object, Bucket=self.bucket, Key=self.object_key(key), ChecksumMode="ENABLED"
+            )
+        except self.client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await self.head(key) is not None
+
+    def object_args(self, key: str) -> dict:
+        extra = {"ChecksumAlgorithm": "SHA256"}
+        media_type = mimetypes.guess_type(key)[0]
+        if media_type:
+            extra["ContentType"] = media_type
+        return extra
+
+    async def upload(self, path: Path, key: str):
+        await asyncio.to_thread(
+            self.s3.upload_file, str(path), self.bucket, self.object_key(key), ExtraArgs=self.object_args(key)
+        )
+
+    async def put(self, source: Path, key: str):
+        try:
+            if not await self.exists(key):
+                await self.upload(source, key)
+        finally:
+            source.unlink(missing_ok=True)
+
+    async def move(self, source_key: str, key: str):
+        """Like put(), for an object already in the bucket, such as a direct upload."""
+        if not await self.exists(key):
+            await asyncio.to_thread(
+                self.s3.copy, {"Bucket": self.bucket, "Key": self.object_key(source_key)},
+                self.bucket, self.object_key(key), ExtraArgs={**self.object_args(key), "MetadataDirective": "REPLACE"}
+            )
+        await self.delete(source_key)
+
+    async def delete(self, key: str):
+        # The audio object and its sidecars share the key as a prefix
+        paginator = self.s3.get_paginator("list_objects_v2")
+        
+        def delete_objects():
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(key)):
+                objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+                if objects:
+                    self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+        await asyncio.to_thread(delete_objects)
+
+    @asynccontextmanager
+    async def local_file(self, key: str):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / Path(key).name
+            await asyncio.to_thread(self.s3.download_file, self.bucket, self.object_key(key), str(path))
+            yield path
+
+    async def publish(self, key: str, path: Path):
+        """Upload the HLS segments and peaks generated next to ``path``."""
+        hls_path, peaks_file = blob_sidecars(path)
+        if hls_path.is_dir():
+            for segment in sorted(hls_path.iterdir()):
+                await self.upload(segment, f"{key}.hls/{segment.name}")
+        if peaks_file.is_file():
+            await self.upload(peaks_file, f"{key}.peaks")
+
+    async def cached_file(self, key: str) -> Path:
+        """Return a local copy of a (small, immutable) object, downloading it once."""
+        path = STORAGE_CACHE_DIR / key
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+            try:
+                await asyncio.to_thread(self.s3.download_file, self.bucket, self.object_key(key), str(tmp_path))
+            except self.client_error as e:
+                tmp_path.unlink(missing_ok=True)
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                    raise FileNotFoundError(key)
+                raise
+            os.replace(tmp_path, path)
+        return path
+
+    def download_url(self, key: str, method: str = "GET") -> str:
+        return self.s3.generate_presigned_url(
+            "head_object" if method == "HEAD" else "get_object",
+            Params={"Bucket": self.bucket, "Key": self.object_key(key)},
+            ExpiresIn=self.expires,
+        )
+
+    def upload_url(self, key: str, checksum: str):
+        """Return a presigned PUT URL and the headers the client must send with it.
+
+        S3 rejects the upload unless the body matches ``checksum``.
+        """
+        checksum = base64.b64encode(bytes.fromhex(checksum)).decode()
+        url = self.s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": self.object_key(key), "ChecksumSHA256": checksum},
+            ExpiresIn=self.expires,
+        )
+        return url, {"x-amz-checksum-sha256": checksum}
+
+    async def verify(self, key: str, checksum: str, size: int) -> bool:
+        """Check that a directly uploaded object has the declared size and sha256."""
+        head = await self.head(key)
+        if head is None or head["ContentLength"] != size:
+            return False
+        if head.get("ChecksumSHA256"):
+            return base64.b64decode(head["ChecksumSHA256"]).hex() == checksum
+        # The store did not record a checksum, so hash the object ourselves
+        async with self.local_file(key) as path:
+            return await asyncio.to_thread(hash_file, path) == checksum
+
+if AUDIO_STORAGE_URL:
+    storage = S3Storage(AUDIO_STORAGE_URL, S3_ENDPOINT_URL, STORAGE_PRESIGN_SECONDS)
+else:
+    storage = LocalStorage()
+
+def blob_path(checksum: str, extension: str) -> str:
+    return f"{checksum[:2]}/{checksum[2:4]}/{checksum}.{extension.lower()}"
+
+def blob_sidecars(path: Path):
+    return [hls_directory(path), peaks_path(path)]
+
+def place_blob(source: Path, dest: Path):
+    if dest.exists():
+        # Already stored by an earlier upload
+        source.unlink(missing_ok=True)
+        return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.part")
+    shutil.move(source, tmp_path)
+    os.replace(tmp_path, dest)
+
+async def register_blob(checksum: str, size: int, extension: str) -> dict:
+    """Add a reference to the blob with this content, creating its document if needed."""
+    return await db.blobs.find_one_and_update(
+        {"_id": checksum},
+        {
+            "$inc": {"refs": 1},
+            "$setOnInsert": {"path": blob_path(checksum, extension), "size": size,
+                             "created_at": datetime.utcnow()},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def store_blob(source: Path, checksum: str, size: int, extension: str) -> dict:
+    """Move ``source`` into storage, or discard it if its content is already stored.
+
+    Returns the blob document, whose ``refs`` already counts the caller.
+    """
+    blob = await register_blob(checksum, size, extension)
+    try:
+        await storage.put(source, blob["path"])
+    except BaseException:
+        # No episode will hold the reference, and the upload is not kept
+        await release_blob(checksum)
+        source.unlink(missing_ok=True)
+        raise
+    return blob
+
+async def store_uploaded_blob(key: str, checksum: str, size: int, extension: str) -> dict:
+    """Like store_blob(), for a verified object uploaded directly to storage under ``key``."""
+    blob = await register_blob(checksum, size, extension)
+    try:
+        await storage.move(key, blob["path"])
+    except BaseException:
+        # The upload stays in place, so completing the session can be retried
+        await release_blob(checksum)
+        raise
+    return blob
+
+def remove_blob_files(path: Path):
+    path.unlink(missing_ok=True)
+    hls_path, peaks_file = blob_sidecars(path)
+    shutil.rmtree(hls_path, ignore_errors=True)
+    peaks_file.unlink(missing_ok=True)
+
+def move_blob_sidecars(old_path: Path, new_path: Path):
+    for old, new in zip(blob_sidecars(old_path), blob_sidecars(new_path)):
+        if not old.exists():
+            continue
+        if new.exists():
+            if old.is_dir():
+                shutil.rmtree(old)
+            else:
+                old.unlink()
+        else:
+            shutil.move(old, new)
+
+async def release_blob(checksum: str):
+    blob = await db.blobs.find_one_and_update(
+        {"_id": checksum}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER
+    )
+    if blob and blob["refs"] <= 0:
+        result = await db.blobs.delete_one({"_id": checksum, "refs": {"$lte": 0}})
+        if result.deleted_count:
+            await storage.delete(blob["path"])
+
+async def add_episode(podcast_id: str, title: str, description: str, blob: dict) -> Episode:
+    fields = {}
+    if blob["refs"] > 1:
+        # Reuse the metadata of another episode with the same audio
+        fields = await db.episodes.find_one(
+            {"sha256": blob["_id"], "duration": {"$ne": None}}, {"_id": 0, **dict.fromkeys(MEDIA_FIELDS, 1)}
+        ) or {}
+    episode = Episode(
+        podcast_id=podcast_id,
+        title=title,
+        description=description,
+        audio_file=blob["path"],
+        size=blob["size"],
+        sha256=blob["_id"],
+        **fields
+    )
+    try:
+        await db.episodes.insert_one(episode.dict())
+    except BaseException:
+        await release_blob(blob["_id"])
+        raise
+    await episode_created(episode)
+    return episode
+
+def link_or_copy(source: Path, dest: Path):
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
+
+async def migrate_storage() -> int:
+    """Move episodes still using flat uuid4 filenames into the blob store.
+
+    The original file is only removed once the episode points at its blob, so
+    an interrupted run is resumed by the next one. If the process dies
+    mid-episode, the blob may keep an extra reference, which only keeps it
+    stored.
+    """
+    migrated = 0
+    episodes = await db.episodes.find(
+        {"audio_file": {"$not": re.compile("/")}}, {"_id": 0, "id": 1, "podcast_id": 1, "audio_file": 1}
+    ).to_list(None)
+    for episode in episodes:
+        path = UPLOAD_DIR / episode["audio_file"]
+        if not path.is_file():
+            logger.warning(f"Audio file of episode {episode['id']} is missing: {path}")
+            continue
+        checksum = await asyncio.to_thread(hash_file, path)
+        size = path.stat().st_size
+        # store_blob consumes its source, so hand it a link to the original
+        copy_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        await asyncio.to_thread(link_or_copy, path, copy_path)
+        blob = await store_blob(copy_path, checksum, size, path.suffix.lstrip("."))
+        await storage.publish(blob["path"], path)
+        updates = {"audio_file": blob["path"], "size": size, "sha256": checksum}
+        try:
+            await db.episodes.update_one({"id": episode["id"]}, {"$set": updates})
+        except BaseException:
+            await release_blob(checksum)
+            raise
+        await asyncio.to_thread(remove_blob_files, path)
+        await episode_updated(episode["id"], episode["podcast_id"], updates)
+        migrated += 1
+    return migrated
 
 # Episode routes
+async def check_episode_upload(podcast_id: str, current_user: User):
+    if current_user.role != "podcaster":
+        raise HTTPException(status_code=403, detail="Only podcasters can upload episodes")
+    
+    # Check if podcast exists and user owns it
+    podcast = await db.podcasts.find_one({"id": podcast_id, "creator_id": current_user.id})
+    if not podcast:
+        raise HTTPException(status_code=404, detail="Podcast not found or not owned by user")
+    return podcast
+
 @api_router.post("/podcasts/{podcast_id}/episodes")
 async def create_episode(
     podcast_id: str,
@@ -222,45 +2119,25 @@ async def create_episode(
     audio_file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
-    if current_user.role != "podcaster":
-        raise HTTPException(status_code=403, detail="Only podcasters can upload episodes")
-    
-    # Check if podcast exists and user owns it
-    podcast = await db.podcasts.find_one({"id": podcast_id, "creator_id": current_user.id})
-    if not podcast:
-        raise HTTPException(status_code=404, detail="Podcast not found or not owned by user")
+    await check_episode_upload(podcast_id, current_user)
     
     # Save audio file
-    file_extension = audio_file.filename.split('.')[-1]
-    if file_extension.lower() not in ['mp3', 'wav', 'ogg']:
-        raise HTTPException(status_code=400, detail="Only MP3, WAV, and OGG files are supported")
-    
-    filename = f"{str(uuid.uuid4())}.{file_extension}"
-    file_path = UPLOAD_DIR / filename
-    
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await audio_file.read()
-        await f.write(content)
+    file_extension = audio_extension(audio_file.filename)
     
-    episode = Episode(
-        podcast_id=podcast_id,
-        title=title,
-        description=description,
-        audio_file=filename
-    )
-    
-    await db.episodes.insert_one(episode.dict())
-    return episode
+    tmp_path, size, checksum = await save_upload(audio_file)
+    blob = await store_blob(tmp_path, checksum, size, file_extension)
+    return await add_episode(podcast_id, title, description, blob)
 
 @api_router.get("/podcasts/{podcast_id}/episodes", response_model=List[Episode])
-async def get_episodes(podcast_id: str):
-    episodes = await db.episodes.find({"podcast_id": podcast_id}).to_list(1000)
-    return [Episode(**episode) for episode in episodes]
+async def get_episodes(podcast_id: str, request: Request, page: PageParams = Depends()):
+    return await cached_response(
+        request, [f"podcast:{podcast_id}"],
+        lambda: paginate(db.episodes, {"podcast_id": podcast_id}, Episode, page)
+    )
 
 @api_router.get("/episodes", response_model=List[Episode])
-async def get_all_episodes():
-    episodes = await db.episodes.find().to_list(1000)
-    return [Episode(**episode) for episode in episodes]
+async def get_all_episodes(request: Request, page: PageParams = Depends()):
+    return await cached_response(request, ["episodes"], lambda: paginate(db.episodes, {}, Episode, page))
 
 @api_router.get("/episodes/{episode_id}", response_model=Episode)
 async def get_episode(episode_id: str):
@@ -269,25 +2146,1139 @@ async def get_episode(episode_id: str):
         raise HTTPException(status_code=404, detail="Episode not found")
     return Episode(**episode)
 
+# Play events
+#
+# Counting every play or progress ping with its own write would swamp Mongo, so
+# events only increment counters in memory. A background task writes them out
+# as $inc upserts into "episode_stats", one document per episode and bucket.
+PLAY_EVENT_FIELDS = {"play": "plays", "progress": "progress", "complete": "completes"}
+
+class WriteBehind(ABC):
+    """In-memory state written to Mongo by a background task.
+
+    Subclasses implement flush(), which runs every ``interval`` seconds, as
+    soon as ``wake`` is set, and a last time on stop().
+    """
+
+    def __init__(self):
+        self.wake = asyncio.Event()
+        self.task = None
+
+    @abstractmethod
+    async def flush(self) -> int:
+        """Write out the pending state and return how many documents were updated."""
+
+    async def run(self, interval: float):
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            await self.flush()
+
+    def start(self, interval: float):
+        self.task = asyncio.create_task(self.run(interval))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+class PlayEventBuffer(WriteBehind):
+    """In-memory play event counters, written to Mongo in batches."""
+
+    def __init__(self, bucket_seconds: int, max_keys: int, max_known: int):
+        super().__init__()
+        self.bucket_seconds = bucket_seconds
+        self.max_keys = max_keys
+        self.max_known = max_known
+        self.counts = {}  # (episode_id, bucket start) -> {field: increment}
+        self.known = OrderedDict()  # episode ids seen in the catalog, least recent first
+
+    async def is_known(self, episode_id: str) -> bool:
+        """Whether the episode exists, so events for made-up ids never take buffer space."""
+        if episode_id in self.known:
+            self.known.move_to_end(episode_id)
+            return True
+        if not await db.episodes.find_one({"id": episode_id}, {"_id": 1}):
+            return False
+        # Episodes are never deleted, so a known id stays valid
+        self.known[episode_id] = None
+        while len(self.known) > self.max_known:
+            self.known.popitem(last=False)
+        return True
+
+    def add(self, episode_id: str, events: List[PlayEvent], now: float) -> bool:
+        """Count a batch of events, all or none, so a rejected batch can be retried as is."""
+        if not events:
+            return True
+        key = (episode_id, int(now // self.bucket_seconds * self.bucket_seconds))
+        counts = self.counts.get(key)
+        if counts is None:
+            if len(self.counts) >= self.max_keys:
+                self.wake.set()
+                return False
+            counts = self.counts[key] = {}
+            if len(self.counts) >= self.max_keys // 2:
+                self.wake.set()
+        for event in events:
+            field = PLAY_EVENT_FIELDS[event.type]
+            counts[field] = counts.get(field, 0) + 1
+            if event.listened:
+                counts["listened"] = counts.get("listened", 0) + event.listened
+        return True
+
+    def merge(self, counts: dict):
+        for key, fields in counts.items():
+            if key not in self.counts and len(self.counts) >= self.max_keys:
+                continue
+            pending = self.counts.setdefault(key, {})
+            for field, value in fields.items():
+                pending[field] = pending.get(field, 0) + value
+
+    async def flush(self) -> int:
+        """Write out the pending counters and return how many documents were updated."""
+        if not self.counts:
+            return 0
+        counts, self.counts = self.counts, {}
+        try:
+            # Trending ranks podcasts too, so look up each episode's podcast;
+            # counters for episodes that have gone missing are dropped
+            episode_ids = list({episode_id for episode_id, _ in counts})
+            podcast_ids = {
+                episode["id"]: episode["podcast_id"]
+                async for episode in db.episodes.find({"id": {"$in": episode_ids}}, {"id": 1, "podcast_id": 1})
+            }
+            keys = [key for key in counts if key[0] in podcast_ids]
+            if keys:
+                await db.episode_stats.bulk_write([
+                    UpdateOne(
+                        {"episode_id": episode_id, "bucket": datetime.utcfromtimestamp(bucket)},
+                        {"$inc": counts[(episode_id, bucket)]},
+                        upsert=True,
+                    )
+                    for episode_id, bucket in keys
+                ], ordered=False)
+        except BulkWriteError as e:
+            # Only the failed updates are retried, the others were applied
+            failed = {keys[error["index"]] for error in e.details["writeErrors"]}
+            logger.error(f"Failed to write {len(failed)} play event counters, retrying them later")
+            self.merge({key: counts[key] for key in failed})
+            keys = [key for key in keys if key not in failed]
+        except PyMongoError:
+            logger.exception("Failed to write play events, keeping them for the next flush")
+            self.merge(counts)
+            return 0
+        # Counters are only ranked once written, so retried ones are not counted twice
+        await trending.record({key: counts[key] for key in keys}, podcast_ids)
+        return len(keys)
+
+play_events = PlayEventBuffer(EVENT_BUCKET_SECONDS, EVENT_BUFFER_LIMIT, EVENT_KNOWN_EPISODES)
+
+@api_router.post("/episodes/{episode_id}/events", status_code=202)
+async def record_play_events(
+    episode_id: str,
+    events: Union[PlayEvent, Annotated[List[PlayEvent], Field(max_length=EVENT_BATCH_LIMIT)]],
+):
+    if not await play_events.is_known(episode_id):
+        raise HTTPException(status_code=404, detail="Episode not found")
+    if not play_events.add(episode_id, events if isinstance(events, list) else [events], time.time()):
+        raise HTTPException(status_code=503, detail="Too many pending events, please try again",
+                            headers={"Retry-After": str(math.ceil(EVENT_FLUSH_SECONDS))})
+    return {"message": "Events accepted"}
+
+@api_router.get("/episodes/{episode_id}/stats", response_model=EpisodeStats)
+async def get_episode_stats(episode_id: str, current_user: User = Depends(get_current_user)):
+    """Play counts per bucket. Counters are written behind, so they lag by up to EVENT_FLUSH_SECONDS."""
+    episode = await db.episodes.find_one({"id": episode_id}, {"podcast_id": 1})
+    if not episode or not await db.podcasts.find_one({"id": episode["podcast_id"], "creator_id": current_user.id}):
+        raise HTTPException(status_code=404, detail="Episode not found")
+    buckets = await db.episode_stats.find({"episode_id": episode_id}, {"_id": 0, "episode_id": 0}).sort(
+        "bucket", ASCENDING
+    ).to_list(None)
+    stats = EpisodeStats(episode_id=episode_id, buckets=buckets)
+    for bucket in stats.buckets:
+        stats.plays += bucket.plays
+        stats.progress += bucket.progress
+        stats.completes += bucket.completes
+        stats.listened += bucket.listened
+    return stats
+
+# Trending
+#
+# Plays and completions raise the score of an episode and of its podcast. A
+# score decays exponentially, so it is sum(weight * e^((t - now) / tau)) over
+# past events. Scores are kept as log(sum(weight * e^(t / tau))) instead, which
+# does not change as time passes: everything decays at the same rate, so the
+# ranking only moves when events arrive. Sorted lists per kind and category
+# are updated with bisect, and the top N is a slice.
+#
+# Each worker adds its own events to the "trending" collection at checkpoints
+# (log-sum-exp in an update pipeline, so concurrent workers add up) and then
+# reloads it to pick up everyone else's.
+TRENDING_WEIGHTS = {"plays": 1.0, "completes": 1.0}
+
+def log_add(a: float, b: float) -> float:
+    """log(e^a + e^b) without overflow."""
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+def log_add_expression(field: str, value: float) -> dict:
+    """Mongo expression for log_add(field, value), or value if the field is missing."""
+    return {"$cond": [
+        {"$eq": [{"$ifNull": [field, None]}, None]},
+        value,
+        {"$let": {
+            "vars": {"top": {"$max": [field, value]}},
+            "in": {"$add": ["$$top", {"$ln": {"$add": [
+                {"$exp": {"$subtract": [field, "$$top"]}},
+                {"$exp": {"$subtract": [value, "$$top"]}},
+            ]}}]},
+        }},
+    ]}
+
+class TrendingIndex:
+    """Time-decayed scores of podcasts and episodes, ranked in memory."""
+
+    def __init__(self, half_life: float):
+        self.tau = half_life / math.log(2)
+        self.scores = {}  # (kind, item id) -> (log score, category)
+        self.rankings = {}  # (kind, category or None) -> sorted [(-log score, item id)]
+        self.pending = {}  # (kind, item id) -> (log score, category) not checkpointed yet
+        self.categories = {}  # podcast id -> category
+        self.task = None
+
+    def add(self, kind: str, item_id: str, category: str, weight: float, now: float):
+        value = math.log(weight) + now / self.tau
+        key = (kind, item_id)
+        old = self.scores.get(key)
+        new = value if old is None else log_add(old[0], value)
+        self.scores[key] = (new, category)
+        if old is not None:
+            for ranking_key in ((kind, None), (kind, old[1])):
+                ranking = self.rankings[ranking_key]
+                del ranking[bisect.bisect_left(ranking, (-old[0], item_id))]
+        for ranking_key in ((kind, None), (kind, category)):
+            bisect.insort(self.rankings.setdefault(ranking_key, []), (-new, item_id))
+        pending = self.pending.get(key)
+        self.pending[key] = (value if pending is None else log_add(pending[0], value), category)
+
+    async def record(self, counts: dict, podcast_ids: dict):
+        """Add flushed play event counters, keyed by (episode id, bucket)."""
+        missing = list({podcast_ids[episode_id] for episode_id, _ in counts} - set(self.categories))
+        try:
+            if missing:
+                async for podcast in db.podcasts.find({"id": {"$in": missing}}, {"id": 1, "category": 1}):
+                    self.categories[podcast["id"]] = podcast["category"]
+        except PyMongoError:
+            logger.exception("Failed to look up podcast categories for trending scores")
+        now = time.time()
+        for (episode_id, _), fields in counts.items():
+            weight = sum(fields.get(field, 0) * value for field, value in TRENDING_WEIGHTS.items())
+            podcast_id = podcast_ids[episode_id]
+            category = self.categories.get(podcast_id)
+            if weight <= 0 or category is None:
+                continue
+            self.add("episode", episode_id, category, weight, now)
+            self.add("podcast", podcast_id, category, weight, now)
+
+    def top(self, kind: str, category: Optional[str], limit: int, now: float):
+        """Return [(item id, decayed score)] for the ``limit`` highest scores."""
+        ranking = self.rankings.get((kind, category), [])
+        return [(item_id, math.exp(-negated - now / self.tau)) for negated, item_id in ranking[:limit]]
+
+    async def load(self, now: float):
+        """Replace the in-memory scores with the checkpoint plus events not yet in it."""
+        threshold = math.log(TRENDING_MIN_SCORE) + now / self.tau
+        documents = await db.trending.find(
+            {"score": {"$gte": threshold}}, {"_id": 0, "kind": 1, "item_id": 1, "category": 1, "score": 1}
+        ).to_list(None)
+        scores = {(doc["kind"], doc["item_id"]): (doc["score"], doc["category"]) for doc in documents}
+        for key, (value, category) in self.pending.items():
+            old = scores.get(key, (None,))[0]
+            scores[key] = (value if old is None else log_add(old, value), category)
+        rankings = {}
+        for (kind, item_id), (value, category) in scores.items():
+            for ranking_key in ((kind, None), (kind, category)):
+                rankings.setdefault(ranking_key, []).append((-value, item_id))
+        for ranking in rankings.values():
+            ranking.sort()
+        self.scores, self.rankings = scores, rankings
+
+    async def checkpoint(self):
+        now = time.time()
+        pending, self.pending = self.pending, {}
+        try:
+            if pending:
+                await db.trending.bulk_write([
+                    UpdateOne({"_id": f"{kind}:{item_id}"}, [{"$set": {
+                        "kind": kind,
+                        "item_id": item_id,
+                        "category": category,
+                        "score": log_add_expression("$score", value),
+                    }}], upsert=True)
+                    for (kind, item_id), (value, category) in pending.items()
+                ], ordered=False)
+            await db.trending.delete_many({"score": {"$lt": math.log(TRENDING_MIN_SCORE) + now / self.tau}})
+        except PyMongoError:
+            logger.exception("Failed to checkpoint trending scores")
+            for key, (value, category) in pending.items():
+                current = self.pending.get(key)
+                self.pending[key] = (value if current is None else log_add(current[0], value), category)
+            return
+        await self.reload(now)
+
+    async def reload(self, now: float):
+        try:
+            await self.load(now)
+        except PyMongoError:
+            logger.exception("Failed to load trending scores")
+
+    async def run(self, interval: float):
+        await self.reload(time.time())
+        while True:
+            await asyncio.sleep(interval)
+            await self.checkpoint()
+
+    def start(self, interval: float):
+        self.task = asyncio.create_task(self.run(interval))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.checkpoint()
+
+trending = TrendingIndex(TRENDING_HALF_LIFE_HOURS * 3600)
+
+@api_router.get("/trending")
+async def get_trending(
+    category: Optional[str] = Query(None, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """The most played podcasts and episodes lately, highest score first."""
+    now = time.time()
+    results = {}
+    for kind, collection, model in (("podcast", db.podcasts, TrendingPodcast), ("episode", db.episodes, TrendingEpisode)):
+        top = trending.top(kind, category, limit, now)
+        documents = {
+            document["id"]: document
+            async for document in collection.find({"id": {"$in": [item_id for item_id, _ in top]}}, {"_id": 0})
+        }
+        results[f"{kind}s"] = [model(**documents[item_id], score=score) for item_id, score in top
+                               if item_id in documents]
+    return results
+
+# Playback progress
+#
+# Players report their position every few seconds, so positions live in memory
+# and only the latest one per (user, episode) is written, in batches. The
+# newest updated_at wins both in memory and in Mongo, so a late update from
+# another device never replaces a newer position.
+class ProgressStore(WriteBehind):
+    """Playback positions by (user id, episode id), cached and written behind."""
+
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (user id, episode id) -> PlaybackProgress, oldest first
+        self.dirty = set()
+
+    async def get(self, user_id: str, episode_id: str) -> Optional[PlaybackProgress]:
+        key = (user_id, episode_id)
+        progress = self.entries.get(key)
+        if progress is not None:
+            self.entries.move_to_end(key)
+            return progress
+        document = await db.progress.find_one({"user_id": user_id, "episode_id": episode_id}, {"_id": 0})
+        if document is None:
+            return None
+        progress = PlaybackProgress(**document)
+        # An update may have arrived while Mongo was being read
+        if key not in self.entries:
+            self.entries[key] = progress
+            self.evict()
+        return self.entries[key]
+
+    async def put(self, user_id: str, progress: PlaybackProgress) -> PlaybackProgress:
+        key = (user_id, progress.episode_id)
+        # Evicted entries are never dirty, so on a miss Mongo holds the current position
+        current = await self.get(user_id, progress.episode_id)
+        if current is not None and current.updated_at > progress.updated_at:
+            return current
+        self.entries[key] = progress
+        self.entries.move_to_end(key)
+        self.dirty.add(key)
+        self.evict()
+        return progress
+
+    def evict(self):
+        while len(self.entries) > self.max_entries:
+            for key in self.entries:
+                if key not in self.dirty:
+                    del self.entries[key]
+                    break
+            else:
+                # Everything is waiting to be written
+                self.wake.set()
+                return
+
+    async def flush(self) -> int:
+        if not self.dirty:
+            return 0
+        # Entries that are no longer dirty may be evicted while writing
+        pending = {key: self.entries[key] for key in self.dirty}
+        self.dirty = set()
+        keys = []
+        try:
+            episode_ids = list({episode_id for _, episode_id in pending})
+            known = set(await db.episodes.distinct("id", {"id": {"$in": episode_ids}}))
+            for key in pending:
+                if key[1] in known:
+                    keys.append(key)
+                elif key not in self.dirty:
+                    self.entries.pop(key, None)
+            if keys:
+                await db.progress.bulk_write([
+                    UpdateOne(
+                        {"user_id": key[0], "episode_id": key[1], "updated_at": {"$lt": pending[key].updated_at}},
+                        {"$set": {"user_id": key[0], **pending[key].dict()}},
+                        upsert=True,
+                    )
+                    for key in keys
+                ], ordered=False)
+        except BulkWriteError as e:
+            retry = []
+            for error in e.details["writeErrors"]:
+                key = keys[error["index"]]
+                if error["code"] != 11000:
+                    retry.append(key)
+                elif key not in self.dirty:
+                    # Mongo has a newer position, read it next time
+                    self.entries.pop(key, None)
+            if retry:
+                logger.error(f"Failed to write {len(retry)} playback positions, retrying them later")
+                self.restore({key: pending[key] for key in retry})
+            return len(keys) - len(e.details["writeErrors"])
+        except PyMongoError:
+            logger.exception("Failed to write playback positions, keeping them for the next flush")
+            self.restore(pending)
+            return 0
+        return len(keys)
+
+    def restore(self, pending: dict):
+        """Mark positions whose write failed as dirty again, unless replaced since."""
+        for key, progress in pending.items():
+            if key not in self.dirty:
+                self.entries[key] = progress
+                self.dirty.add(key)
+
+progress_store = ProgressStore(PROGRESS_CACHE_SIZE)
+
+@api_router.put("/me/progress/{episode_id}", response_model=PlaybackProgress)
+async def put_progress(episode_id: str, update: ProgressUpdate, current_user: User = Depends(get_current_user)):
+    now = datetime.utcnow()
+    updated_at = update.updated_at or now
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    # A device with a fast clock must not pin its position forever
+    updated_at = min(updated_at, now)
+    return await progress_store.put(current_user.id, PlaybackProgress(
+        episode_id=episode_id, position=update.position, completed=update.completed, updated_at=updated_at
+    ))
+
+@api_router.get("/me/progress/{episode_id}", response_model=PlaybackProgress)
+async def get_progress(episode_id: str, current_user: User = Depends(get_current_user)):
+    progress = await progress_store.get(current_user.id, episode_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No progress saved for this episode")
+    return progress
+
+# Subscriptions and inbox
+#
+# Each user's inbox holds (created_at, episode_id) entries for the episodes of
+# the podcasts they follow, written when an episode is created, so reading it
+# is a range scan of the user_id_created_at_episode_id index. Copying every
+# episode into a huge audience is too costly, so once a podcast has more than
+# INBOX_FANOUT_LIMIT subscribers its subscriptions are flagged "large" and
+# inbox reads merge in that podcast's episodes from the episodes collection.
+# A podcast stays large once it has been.
+fanout_tasks = set()
+
+async def add_to_inbox(entries: List[dict]):
+    """Insert inbox entries, ignoring the ones already there."""
+    try:
+        await db.inbox.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+async def fan_out_episode(episode_id: str, podcast_id: str, created_at: datetime) -> int:
+    podcast = await db.podcasts.find_one({"id": podcast_id}, {"_id": 0, "subscribers": 1})
+    if podcast is None or podcast.get("subscribers", 0) > INBOX_FANOUT_LIMIT:
+        return 0
+    entry = {"episode_id": episode_id, "podcast_id": podcast_id, "created_at": created_at}
+    count = 0
+    batch = []
+    async for subscription in db.subscriptions.find(
+        {"podcast_id": podcast_id, "large": {"$ne": True}}, {"_id": 0, "user_id": 1}
+    ):
+        batch.append({"user_id": subscription["user_id"], **entry})
+        if len(batch) >= INBOX_FANOUT_BATCH:
+            await add_to_inbox(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await add_to_inbox(batch)
+        count += len(batch)
+    return count
+
+async def run_inbox_fanout(episode: Episode):
+    try:
+        await fan_out_episode(episode.id, episode.podcast_id, episode.created_at)
+    except PyMongoError:
+        logger.exception(f"Failed to add episode {episode.id} to subscriber inboxes")
+
+def schedule_inbox_fanout(episode: Episode):
+    task = asyncio.create_task(run_inbox_fanout(episode))
+    fanout_tasks.add(task)
+    task.add_done_callback(fanout_tasks.discard)
+
+async def read_inbox(user_id: str, page: PageParams) -> Response:
+    """Return one page of the user's inbox, newest episode first."""
+    query = {"user_id": user_id}
+    if page.cursor:
+        created_at, last_id = decode_cursor(page.cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "episode_id": {"$lt": last_id}},
+        ]
+    entries = [
+        {"id": entry["episode_id"], "created_at": entry["created_at"]}
+        async for entry in db.inbox.find(query, {"_id": 0, "episode_id": 1, "created_at": 1}).sort(
+            [("created_at", -1), ("episode_id", -1)]
+        ).limit(page.limit + 1)
+    ]
+    large = await db.subscriptions.distinct("podcast_id", {"user_id": user_id, "large": True})
+    if large:
+        pulled = await db.episodes.find(
+            page_query({"podcast_id": {"$in": large}}, page), {"_id": 0, "id": 1, "created_at": 1}
+        ).sort([("created_at", -1), ("id", -1)]).limit(page.limit + 1).to_list(page.limit + 1)
+        # Episodes fanned out before the podcast became large are in both lists
+        merged = {entry["id"]: entry for entry in entries + pulled}
+        entries = sorted(merged.values(), key=lambda entry: (entry["created_at"], entry["id"]), reverse=True)
+        del entries[page.limit + 1:]
+    
+    headers = page_headers(entries, page)
+    projection, names = page_projection(Episode, page)
+    found = {
+        doc["id"]: doc
+        async for doc in db.episodes.find({"id": {"$in": [entry["id"] for entry in entries]}}, projection)
+    }
+    docs = [found[entry["id"]] for entry in entries if entry["id"] in found]
+    return page_response(docs, Episode, names, page, headers)
+
+@api_router.put("/podcasts/{podcast_id}/subscription", response_model=Subscription)
+async def subscribe(podcast_id: str, current_user: User = Depends(get_current_user)):
+    if not await db.podcasts.find_one({"id": podcast_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Podcast not found")
+    result = await db.subscriptions.update_one(
+        {"user_id": current_user.id, "podcast_id": podcast_id},
+        {"$setOnInsert": {"created_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    subscription = await db.subscriptions.find_one(
+        {"user_id": current_user.id, "podcast_id": podcast_id}, {"_id": 0}
+    )
+    if result.upserted_id is None:
+        return Subscription(**subscription)
+    
+    podcast = await db.podcasts.find_one_and_update(
+        {"id": podcast_id}, {"$inc": {"subscribers": 1}},
+        projection={"subscribers": 1}, return_document=ReturnDocument.AFTER,
+    )
+    subscribers = podcast["subscribers"] if podcast else 0
+    if subscribers == INBOX_FANOUT_LIMIT + 1:
+        await db.subscriptions.update_many({"podcast_id": podcast_id}, {"$set": {"large": True}})
+    elif subscribers > INBOX_FANOUT_LIMIT:
+        await db.subscriptions.update_one({"_id": result.upserted_id}, {"$set": {"large": True}})
+    else:
+        episodes = await db.episodes.find(
+            {"podcast_id": podcast_id}, {"_id": 0, "id": 1, "created_at": 1}
+        ).sort([("created_at", -1), ("id", -1)]).limit(INBOX_BACKFILL).to_list(INBOX_BACKFILL)
+        if episodes:
+            await add_to_inbox([
+                {"user_id": current_user.id, "episode_id": episode["id"], "podcast_id": podcast_id,
+                 "created_at": episode["created_at"]}
+                for episode in episodes
+            ])
+    return Subscription(**subscription)
+
+@api_router.delete("/podcasts/{podcast_id}/subscription")
+async def unsubscribe(podcast_id: str, current_user: User = Depends(get_current_user)):
+    result = await db.subscriptions.delete_one({"user_id": current_user.id, "podcast_id": podcast_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Not subscribed to this podcast")
+    await db.podcasts.update_one({"id": podcast_id}, {"$inc": {"subscribers": -1}})
+    await db.inbox.delete_many({"user_id": current_user.id, "podcast_id": podcast_id})
+    return {"message": "Unsubscribed"}
+
+@api_router.get("/me/subscriptions", response_model=List[Subscription])
+async def get_subscriptions(current_user: User = Depends(get_current_user)):
+    return await db.subscriptions.find(
+        {"user_id": current_user.id}, {"_id": 0, "podcast_id": 1, "created_at": 1}
+    ).sort("created_at", -1).to_list(None)
+
+@api_router.get("/me/inbox", response_model=List[Episode])
+async def get_inbox(page: PageParams = Depends(), current_user: User = Depends(get_current_user)):
+    return await read_inbox(current_user.id, page)
+
+# Live updates
+#
+# Server-Sent Events, so the frontend hears about new podcasts and episodes
+# without polling. Each connection holds a short list of encoded frames which
+# publish() appends to; a client that stops reading is cut off rather than
+# buffered for, and reconnects on its own.
+class EventStream:
+    """Frames waiting to be sent to one client."""
+
+    __slots__ = ("frames", "ready", "closed")
+
+    def __init__(self):
+        self.frames = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+
+class EventBroker:
+    """In-process pub/sub between the write hooks and the open event streams."""
+
+    def __init__(self, queue_size: int, max_connections: int):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.streams = set()
+        self.task = None
+
+    def full(self) -> bool:
+        return len(self.streams) >= self.max_connections
+
+    def connect(self) -> EventStream:
+        stream = EventStream()
+        self.streams.add(stream)
+        return stream
+
+    def disconnect(self, stream: EventStream):
+        stream.closed = True
+        stream.ready.set()
+        self.streams.discard(stream)
+
+    def publish(self, event: str, data) -> int:
+        frame = b"event: " + event.encode() + b"\ndata: " + dump_json(jsonable_encoder(data)) + b"\n\n"
+        for stream in list(self.streams):
+            if len(stream.frames) >= self.queue_size:
+                self.disconnect(stream)
+            else:
+                stream.frames.append(frame)
+                stream.ready.set()
+        return len(self.streams)
+
+    def announce(self, event: str, data):
+        """Publish a write made by this worker, unless the change stream will."""
+        if STREAM_FANOUT != "mongo":
+            self.publish(event, data)
+
+    async def watch(self):
+        pipeline = [{"$match": {"operationType": "insert", "ns.coll": {"$in": ["podcasts", "episodes"]}}}]
+        resume_token = None
+        while True:
+            try:
+                async with db.watch(pipeline, resume_after=resume_token) as changes:
+                    async for change in changes:
+                        resume_token = changes.resume_token
+                        document = change["fullDocument"]
+                        if change["ns"]["coll"] == "podcasts":
+                            self.publish("podcast_created", Podcast(**document))
+                        else:
+                            self.publish("episode_created", Episode(**document))
+            except PyMongoError:
+                logger.exception("Change stream for live updates failed, reopening it")
+                await asyncio.sleep(STREAM_HEARTBEAT_SECONDS)
+
+    def start(self):
+        if STREAM_FANOUT == "mongo":
+            self.task = asyncio.create_task(self.watch())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for stream in list(self.streams):
+            self.disconnect(stream)
+
+live_events = EventBroker(STREAM_QUEUE_SIZE, STREAM_MAX_CONNECTIONS)
+
+async def stream_events():
+    stream = live_events.connect()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_SECONDS
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(stream.ready.wait(), min(remaining, STREAM_HEARTBEAT_SECONDS))
+            except asyncio.TimeoutError:
+                yield b": heartbeat\n\n"
+                continue
+            if stream.closed:
+                return
+            stream.ready.clear()
+            while stream.frames:
+                yield stream.frames.popleft()
+    finally:
+        live_events.disconnect(stream)
+
+@api_router.get("/events/stream")
+async def event_stream():
+    if live_events.full():
+        raise HTTPException(status_code=503, detail="Too many live update connections",
+                            headers={"Retry-After": str(int(STREAM_HEARTBEAT_SECONDS))})
+    return StreamingResponse(stream_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# RSS feeds
+#
+# Podcast apps poll feeds every few minutes. Feeds are served through
+# cached_response, so the XML is only rebuilt after the podcast's episodes
+# change and pollers mostly get a 304 for If-None-Match or If-Modified-Since.
+ITUNES_NAMESPACE = "http://www.itunes.com/dtds/podcast-1.0.dtd"
+ET.register_namespace("itunes", ITUNES_NAMESPACE)
+
+def http_date(value: datetime) -> str:
+    return formatdate(value.replace(tzinfo=timezone.utc).timestamp(), usegmt=True)
+
+def render_feed(podcast: dict, author: str, episodes: List[dict], base_url: str, built_at: datetime) -> bytes:
+    def itunes(tag):
+        return f"{{{ITUNES_NAMESPACE}}}{tag}"
+    
+    rss = ET.Element("rss", version="2.0")
+    channel = ET.SubElement(rss, "channel")
+    ET.SubElement(channel, "title").text = podcast["title"]
+    ET.SubElement(channel, "link").text = f"{base_url}/api/podcasts/{podcast['id']}"
+    ET.SubElement(channel, "description").text = podcast["description"]
+    ET.SubElement(channel, "lastBuildDate").text = http_date(built_at)
+    ET.SubElement(channel, itunes("author")).text = author
+    ET.SubElement(channel, itunes("summary")).text = podcast["description"]
+    ET.SubElement(channel, itunes("category"), text=podcast["category"])
+    ET.SubElement(channel, itunes("explicit")).text = "false"
+    if podcast.get("cover_image"):
+        ET.SubElement(channel, itunes("image"), href=podcast["cover_image"])
+    
+    for episode in episodes:
+        item = ET.SubElement(channel, "item")
+        ET.SubElement(item, "title").text = episode["title"]
+        ET.SubElement(item, "description").text = episode["description"]
+        ET.SubElement(item, "guid", isPermaLink="false").text = episode["id"]
+        ET.SubElement(item, "pubDate").text = http_date(episode["created_at"])
+        ET.SubElement(item, "enclosure", {
+            "url": f"{base_url}/api/episodes/{episode['id']}/audio",
+            "length": str(episode.get("size") or 0),
+            "type": mimetypes.guess_type(episode["audio_file"])[0] or "audio/mpeg",
+        })
+        if episode.get("duration") is not None:
+            ET.SubElement(item, itunes("duration")).text = str(episode["duration"])
+        ET.SubElement(item, itunes("summary")).text = episode["description"]
+    return ET.tostring(rss, encoding="utf-8", xml_declaration=True)
+
+@api_router.get("/podcasts/{podcast_id}/feed.xml")
+async def get_podcast_feed(podcast_id: str, request: Request):
+    async def build():
+        podcast = await db.podcasts.find_one({"id": podcast_id}, {"_id": 0})
+        if not podcast:
+            raise HTTPException(status_code=404, detail="Podcast not found")
+        creator = await db.users.find_one({"id": podcast["creator_id"]}, {"username": 1})
+        episodes = await db.episodes.find(
+            {"podcast_id": podcast_id},
+            {"_id": 0, "id": 1, "title": 1, "description": 1, "audio_file": 1, "size": 1, "duration": 1,
+             "created_at": 1}
+        ).sort([("created_at", DESCENDING), ("id", DESCENDING)]).to_list(None)
+        built_at = datetime.utcnow().replace(microsecond=0)
+        body = render_feed(
+            podcast, creator["username"] if creator else "", episodes,
+            PUBLIC_URL or str(request.base_url).rstrip("/"), built_at
+        )
+        return Response(body, media_type="application/rss+xml", headers={"Last-Modified": http_date(built_at)})
+    return await cached_response(request, [f"podcast:{podcast_id}"], build)
+
+# Resumable upload routes
+#
+# A session's metadata, received byte ranges and data live side by side in
+# UPLOAD_SESSION_DIR. Ranges are appended to a log file rather than rewritten,
+# so chunks may be uploaded concurrently, even through different workers.
+# With presigned storage the client PUTs the file to its own key under
+# "uploads/" instead, and it only becomes a blob once verified.
+def upload_session_paths(session_id: str):
+    try:
+        session_id = str(uuid.UUID(session_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    base = UPLOAD_SESSION_DIR / session_id
+    return base.with_suffix(".json"), base.with_suffix(".part"), base.with_suffix(".ranges")
+
+def remove_upload_session(session_id: str):
+    meta_path, data_path, ranges_path = upload_session_paths(session_id)
+    for path in (meta_path, meta_path.with_suffix(".completing"), data_path, ranges_path):
+        path.unlink(missing_ok=True)
+
+def upload_session_key(session: UploadSession) -> str:
+    """Where a session's direct upload is put, apart from the stored blobs until it is verified."""
+    return f"uploads/{session.id}.{audio_extension(session.filename).lower()}"
+
+async def discard_upload_session(session: UploadSession):
+    remove_upload_session(session.id)
+    if session.upload_url:
+        await storage.delete(upload_session_key(session))
+
+def purge_expired_upload_sessions() -> List[UploadSession]:
+    """Remove the local files of expired sessions and return those sessions."""
+    now = datetime.utcnow()
+    expired = []
+    # .completing is the metadata of a session being completed (see below)
+    for meta_path in [*UPLOAD_SESSION_DIR.glob("*.json"), *UPLOAD_SESSION_DIR.glob("*.completing")]:
+        try:
+            session = UploadSession(**json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+        if session.expires_at <= now:
+            remove_upload_session(session.id)
+            expired.append(session)
+    return expired
+
+async def load_upload_session(session_id: str, current_user: User) -> UploadSession:
+    meta_path, _, ranges_path = upload_session_paths(session_id)
+    try:
+        async with aiofiles.open(meta_path) as f:
+            session = UploadSession(**json.loads(await f.read()))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.creator_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.expires_at <= datetime.utcnow():
+        await discard_upload_session(session)
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    if ranges_path.exists():
+        async with aiofiles.open(ranges_path) as f:
+            lines = (await f.read()).split()
+        session.received = merge_ranges(
+            [int(start), int(end)] for start, end in zip(lines[::2], lines[1::2])
+        )
+    return session
+
+@contextmanager
+def lock_upload_session(meta_path: Path, exclusive: bool, busy: str):
+    """Hold a flock on the session's metadata file, or raise a 409 with ``busy``.
+
+    Chunk writes hold it shared and completion exclusively, so the data is
+    never hashed or stored while a chunk is still being written to it. The
+    lock follows the file when completion renames it.
+    """
+    try:
+        f = open(meta_path, 'rb')
+    except FileNotFoundError:
+        raise HTTPException(status_code=409, detail=busy)
+    with f:
+        try:
+            fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=409, detail=busy)
+        yield
+
+async def write_upload_chunk(session: UploadSession, offset: int, request: Request) -> UploadSession:
+    if session.upload_url:
+        raise HTTPException(status_code=409, detail="Upload the file to the session's upload_url")
+    if offset < 0 or offset >= session.size:
+        raise HTTPException(status_code=416, detail="Chunk offset outside of the upload")
+    
+    meta_path, data_path, ranges_path = upload_session_paths(session.id)
+    busy = "Upload session is being completed"
+    with lock_upload_session(meta_path, False, busy):
+        # Completion may have claimed the session between opening and locking
+        if not meta_path.exists():
+            raise HTTPException(status_code=409, detail=busy)
+        written = 0
+        try:
+            async with aiofiles.open(data_path, 'r+b') as f:
+                await f.seek(offset)
+                async for chunk in request.stream():
+                    if offset + written + len(chunk) > session.size:
+                        raise HTTPException(status_code=400, detail="Chunk extends past the end of the upload")
+                    await f.write(chunk)
+                    written += len(chunk)
+        finally:
+            # Keep whatever arrived before a dropped connection so it is not resent
+            if written:
+                async with aiofiles.open(ranges_path, 'a') as f:
+                    await f.write(f"{offset} {offset + written}\n")
+    
+    session.received = merge_ranges(session.received + [[offset, offset + written]])
+    return session
+
+@api_router.post("/podcasts/{podcast_id}/upload-sessions", response_model=UploadSession)
+async def create_upload_session(
+    podcast_id: str,
+    session_data: UploadSessionCreate,
+    current_user: User = Depends(get_current_user)
+):
+    await check_episode_upload(podcast_id, current_user)
+    audio_extension(session_data.filename)
+    for expired in await asyncio.to_thread(purge_expired_upload_sessions):
+        if expired.upload_url:
+            await storage.delete(upload_session_key(expired))
+    
+    session = UploadSession(
+        podcast_id=podcast_id,
+        creator_id=current_user.id,
+        expires_at=datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS),
+        **session_data.dict()
+    )
+    # Even when the declared sha256 is already stored, the data must be sent:
+    # knowing a file's hash does not entitle anyone to its content. Duplicates
+    # are found once the received bytes have been verified.
+    if session.sha256:
+        session.sha256 = session.sha256.lower()
+        if storage.presigned:
+            session.upload_url, session.upload_headers = storage.upload_url(
+                upload_session_key(session), session.sha256
+            )
+    meta_path, data_path, _ = upload_session_paths(session.id)
+    if not session.upload_url:
+        with open(data_path, 'wb') as f:
+            f.truncate(session.size)
+    async with aiofiles.open(meta_path, 'w') as f:
+        await f.write(session.json())
+    return session
+
+@api_router.get("/upload-sessions/{session_id}", response_model=UploadSession)
+async def get_upload_session(session_id: str, current_user: User = Depends(get_current_user)):
+    return await load_upload_session(session_id, current_user)
+
+@api_router.put("/upload-sessions/{session_id}", response_model=UploadSession)
+async def put_upload_range(
+    session_id: str,
+    request: Request,
+    offset: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    session = await load_upload_session(session_id, current_user)
+    if offset is None:
+        content_range = re.fullmatch(
+            r"bytes (\d+)-(\d+)/(\d+|\*)", request.headers.get("content-range", "")
+        )
+        if not content_range:
+            raise HTTPException(status_code=400, detail="An offset or Content-Range header is required")
+        offset = int(content_range.group(1))
+    return await write_upload_chunk(session, offset, request)
+
+@api_router.put("/upload-sessions/{session_id}/chunks/{index}", response_model=UploadSession)
+async def put_upload_chunk(
+    session_id: str,
+    index: int,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    session = await load_upload_session(session_id, current_user)
+    return await write_upload_chunk(session, index * session.chunk_size, request)
+
+async def store_upload_session(session: UploadSession) -> dict:
+    """Register the audio of a finished upload session as a blob and return it."""
+    if session.upload_url:
+        key = upload_session_key(session)
+        if not await storage.exists(key):
+            raise HTTPException(status_code=409, detail="Upload is incomplete")
+        if not await storage.verify(key, session.sha256, session.size):
+            await discard_upload_session(session)
+            raise HTTPException(status_code=400, detail="Uploaded data does not match the expected checksum")
+        blob = await store_uploaded_blob(key, session.sha256, session.size, audio_extension(session.filename))
+    else:
+        if session.received != [[0, session.size]]:
+            raise HTTPException(status_code=409, detail="Upload is incomplete")
+        _, data_path, _ = upload_session_paths(session.id)
+        checksum = await asyncio.to_thread(hash_file, data_path)
+        if session.sha256 and session.sha256 != checksum:
+            remove_upload_session(session.id)
+            raise HTTPException(status_code=400, detail="Uploaded data does not match the expected checksum")
+        blob = await store_blob(data_path, checksum, session.size, audio_extension(session.filename))
+    return blob
+
+@api_router.post("/upload-sessions/{session_id}/complete", response_model=Episode)
+async def complete_upload_session(session_id: str, current_user: User = Depends(get_current_user)):
+    session = await load_upload_session(session_id, current_user)
+    # Renaming the metadata claims the session, so concurrent requests cannot
+    # both turn it into an episode and new chunk writes see it as gone. Chunk
+    # writes already under way hold the lock, and completion waits for a retry.
+    meta_path, _, _ = upload_session_paths(session.id)
+    claimed_path = meta_path.with_suffix(".completing")
+    try:
+        os.rename(meta_path, claimed_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=409, detail="Upload session is already being completed")
+    try:
+        busy = "Chunks are still being written, complete the upload once they finish"
+        with lock_upload_session(claimed_path, True, busy):
+            blob = await store_upload_session(session)
+    except BaseException:
+        # Unless the session was discarded, let the client resume or retry
+        if claimed_path.exists():
+            os.rename(claimed_path, meta_path)
+        raise
+    remove_upload_session(session.id)
+    
+    return await add_episode(session.podcast_id, session.title, session.description, blob)
+
+@api_router.delete("/upload-sessions/{session_id}")
+async def delete_upload_session(session_id: str, current_user: User = Depends(get_current_user)):
+    session = await load_upload_session(session_id, current_user)
+    await discard_upload_session(session)
+    return {"message": "Upload session deleted"}
+
+# Audio delivery routes
+def storage_response(request: Request, key: str, etag: Optional[str] = None) -> Response:
+    if not storage.presigned:
+        return audio_response(request, key, etag)
+    if key.startswith("/") or ".." in key.split("/"):
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    # Redirect to the object itself; the URL must not outlive its signature
+    return RedirectResponse(storage.download_url(key, request.method), status_code=307, headers={
+        "Cache-Control": f"private, max-age={STORAGE_PRESIGN_SECONDS // 2}",
+    })
+
+@api_router.api_route("/uploads/{file_path:path}", methods=["GET", "HEAD"])
+async def get_upload(file_path: str, request: Request):
+    return storage_response(request, file_path)
+
+@api_router.api_route("/episodes/{episode_id}/audio", methods=["GET", "HEAD"])
+async def get_episode_audio(episode_id: str, request: Request):
+    episode = await db.episodes.find_one({"id": episode_id}, {"audio_file": 1, "sha256": 1})
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    return storage_response(request, episode["audio_file"], episode.get("sha256"))
+
+@api_router.api_route("/episodes/{episode_id}/hls/{name}", methods=["GET", "HEAD"])
+async def get_episode_hls(episode_id: str, name: str, request: Request):
+    if not re.fullmatch(r"index\.m3u8|segment_\d{5}\.mp3", name):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    episode = await db.episodes.find_one({"id": episode_id}, {"audio_file": 1})
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    key = f"{episode['audio_file']}.hls/{name}"
+    if name == "index.m3u8" and storage.presigned:
+        # Segment URIs are relative, so they must resolve against this route
+        # (which signs them) rather than against a presigned playlist URL
+        try:
+            path = await storage.cached_file(key)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Segment not found")
+        return Response(await asyncio.to_thread(path.read_bytes), media_type="application/vnd.apple.mpegurl",
+                        headers={"Cache-Control": AUDIO_CACHE_CONTROL})
+    return storage_response(request, key)
+
+@api_router.get("/episodes/{episode_id}/peaks")
+async def get_episode_peaks(
+    episode_id: str,
+    zoom: int = Query(0, ge=0),
+    start: float = Query(0, ge=0),
+    end: Optional[float] = Query(None, ge=0)
+):
+    """Interleaved int8 min/max pairs for the buckets between ``start`` and ``end`` seconds."""
+    if not math.isfinite(start) or (end is not None and not math.isfinite(end)):
+        raise HTTPException(status_code=400, detail="start and end must be finite")
+    episode = await db.episodes.find_one({"id": episode_id}, {"audio_file": 1})
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    try:
+        path = await storage.cached_file(peaks_path(Path(episode["audio_file"])).as_posix())
+        peaks = await asyncio.to_thread(read_peaks, path, zoom, start, end)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Peaks not available yet")
+    if peaks is None:
+        raise HTTPException(status_code=400, detail="Unknown zoom level")
+    sample_rate, samples_per_bucket, first_bucket, data = peaks
+    return Response(data, media_type="application/octet-stream", headers={
+        "Cache-Control": AUDIO_CACHE_CONTROL,
+        "X-Peaks-Sample-Rate": str(sample_rate),
+        "X-Peaks-Samples-Per-Bucket": str(samples_per_bucket),
+        "X-Peaks-First-Bucket": str(first_bucket),
+    })
+
+@api_router.get("/discover", response_model=Discover)
+async def discover(request: Request):
+    async def build():
+        documents = {document["_id"]: document async for document in db.discover.find()}
+        totals = documents.get(DISCOVER_TOTALS_ID, {})
+        categories = sorted(
+            (document for document in documents.values() if "category" in document),
+            key=lambda document: (-document["count"], document["category"])
+        )
+        return JSONResponse(jsonable_encoder(Discover(
+            latest_episodes=documents.get(DISCOVER_LATEST_ID, {}).get("episodes", []),
+            categories=categories,
+            podcast_count=totals.get("podcasts", 0),
+            episode_count=totals.get("episodes", 0),
+        )))
+    return await cached_response(request, ["podcasts", "episodes"], build)
+
 # Search routes
+#
+# Both collections carry a "search_text" index (see MONGO_INDEXES), which does
+# the tokenizing and stemming. Results are ranked by text score, with matches
+# in titles weighted above categories and descriptions. Without the index (e.g.
+# MONGO_INDEX_MODE=off, or a failed build) search answers 503 rather than
+# falling back to scanning the collections.
+SEARCH_INDEX = "search_text"
+INDEX_NOT_FOUND = 27  # MongoDB error code
+
+async def text_search(collection, q: str, limit: int, offset: int):
+    score = {"$meta": "textScore"}
+    try:
+        return await collection.find(
+            {"$text": {"$search": q}}, {"_id": 0, "score": score}
+        ).sort([("score", score)]).skip(offset).limit(limit).to_list(limit)
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND:
+            raise
+        logger.error(f"Search failed, the {SEARCH_INDEX} index on {collection.name} is missing")
+        raise HTTPException(status_code=503, detail="Search is unavailable until its index is built")
+
+@api_router.get("/search/suggest")
+async def search_suggest(q: str = Query(..., max_length=200), limit: int = Query(10, ge=1, le=50)):
+    return suggestions.suggest(q, limit)
+
 @api_router.get("/search")
-async def search(q: str):
-    # Search in podcast titles and descriptions
-    podcast_results = await db.podcasts.find({
-        "$or": [
-            {"title": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"category": {"$regex": q, "$options": "i"}}
-        ]
-    }).to_list(50)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    # Search in podcast titles, descriptions and categories
+    podcast_results = await text_search(db.podcasts, q, limit, offset)
     
     # Search in episode titles and descriptions
-    episode_results = await db.episodes.find({
-        "$or": [
-            {"title": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}}
-        ]
-    }).to_list(50)
+    episode_results = await text_search(db.episodes, q, limit, offset)
     
     return {
         "podcasts": [Podcast(**podcast) for podcast in podcast_results],
@@ -299,15 +3290,179 @@ async def search(q: str):
 async def root():
     return {"message": "PodcastHub API is running!"}
 
+# Rate limiting
+#
+# A plain ASGI middleware, so rejected requests cost a route match and a bucket
+# update and never reach FastAPI. It sits inside CORSMiddleware so browsers can
+# read the 429 and 503 responses.
+RATE_LIMIT_ROUTES = [
+    # (method, path, cost, expensive)
+    ("POST", r"/api/auth/(login|register)", 5, True),  # bcrypt
+    ("POST", r"/api/podcasts/[^/]+/episodes", 20, True),  # whole upload in one request
+    ("POST", r"/api/upload-sessions/[^/]+/complete", 10, True),
+    ("GET", r"/api/search", 5, True),
+    ("GET", r"/api/events/stream", 5, False),
+]
+RATE_LIMIT_ROUTE_PATTERNS = [
+    (method, re.compile(path + "$"), cost, expensive) for method, path, cost, expensive in RATE_LIMIT_ROUTES
+]
+
+class MemoryRateLimiter:
+    """Token buckets for the most recent clients of this process."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()  # client -> (tokens, monotonic time), least recent first
+
+    async def take(self, client: str, cost: float) -> float:
+        """Spend ``cost`` tokens, returning 0 or the seconds until they are available."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.rate
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            # Clients unseen for a while have mostly refilled anyway
+            self.buckets.popitem(last=False)
+        return wait
+
+class RedisRateLimiter:
+    """Token buckets in Redis, shared by every worker.
+
+    Each bucket is updated by one script using the Redis clock. Redis errors
+    are logged and the request is let through.
+    """
+
+    prefix = "podcasthub:rate:"
+    script = """
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local tokens = tonumber(bucket[1]) or burst
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= cost then
+            tokens = tokens - cost
+        else
+            wait = (cost - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return tostring(wait)
+    """
+
+    def __init__(self, url: str, rate: float, burst: float):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.errors = redis.RedisError
+        self.take_script = self.redis.register_script(self.script)
+        self.rate = rate
+        self.burst = burst
+
+    async def take(self, client: str, cost: float) -> float:
+        try:
+            wait = await self.take_script(keys=[self.prefix + client], args=[self.rate, self.burst, cost])
+        except self.errors as e:
+            logger.warning(f"Rate limiter unavailable: {e}")
+            return 0.0
+        return float(wait)
+
+class RateLimitMiddleware:
+    """Token-bucket rate limiting per client plus a cap on concurrent expensive requests."""
+
+    def __init__(self, app, limiter, max_expensive: int):
+        self.app = app
+        self.limiter = limiter
+        self.max_expensive = max_expensive
+        self.expensive = 0
+        # Verifying a token costs more than the rest of the middleware, so the
+        # subjects of recently seen valid tokens are remembered
+        self.token_subjects = OrderedDict()
+
+    @staticmethod
+    def route_cost(method: str, path: str):
+        for route_method, pattern, cost, expensive in RATE_LIMIT_ROUTE_PATTERNS:
+            if method == route_method and pattern.match(path):
+                return cost, expensive
+        return 1, False
+
+    def token_subject(self, token: str) -> Optional[str]:
+        subject = self.token_subjects.get(token)
+        if subject is not None:
+            self.token_subjects.move_to_end(token)
+            return subject
+        try:
+            subject = str(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["sub"])
+        except (jwt.PyJWTError, KeyError):
+            return None
+        self.token_subjects[token] = subject
+        if len(self.token_subjects) > RATE_LIMIT_CLIENTS:
+            self.token_subjects.popitem(last=False)
+        return subject
+
+    def client_key(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer":
+                    subject = self.token_subject(token)
+                    if subject is not None:
+                        return "user:" + subject
+                break
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    @staticmethod
+    async def reject(scope, receive, send, status_code: int, detail: str, retry_after: float):
+        response = JSONResponse({"detail": detail}, status_code=status_code,
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        cost, expensive = self.route_cost(scope["method"], scope["path"])
+        if cost and self.limiter is not None:
+            wait = await self.limiter.take(self.client_key(scope), min(cost, self.limiter.burst))
+            if wait:
+                return await self.reject(scope, receive, send, 429, "Too many requests", wait)
+        if not expensive:
+            return await self.app(scope, receive, send)
+        if self.expensive >= self.max_expensive:
+            return await self.reject(scope, receive, send, 503, "Server is busy, please try again", 1)
+        self.expensive += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.expensive -= 1
+
+if RATE_LIMIT_RATE <= 0:
+    rate_limiter = None
+elif RATE_LIMIT_URL:
+    rate_limiter = RedisRateLimiter(RATE_LIMIT_URL, RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+else:
+    rate_limiter = MemoryRateLimiter(RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_CLIENTS)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, max_expensive=EXPENSIVE_REQUEST_LIMIT)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Retry-After", "X-Peaks-Sample-Rate",
+                    "X-Peaks-Samples-Per-Bucket", "X-Peaks-First-Bucket"],
 )
 
 # Configure logging
@@ -317,6 +3472,142 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def index_matches(current: dict, spec: dict) -> bool:
+    if "weights" in spec:
+        # Text index keys are stored as _fts/_ftsx, so compare the weighted fields
+        return (current.get("weights") == spec["weights"]
+                and current.get("default_language") == spec.get("default_language"))
+    return (list(current["key"]) == list(spec["key"].items())
+            and bool(current.get("unique")) == bool(spec.get("unique")))
+
+async def ensure_indexes(check_only: bool = False) -> dict:
+    """Reconcile MONGO_INDEXES with the database and report on each collection.
+
+    Unused indexes are those with no recorded accesses in $indexStats, which
+    mongod counts from its last restart. An index that cannot be built (e.g. a
+    unique index over duplicate values) is logged and listed as failed, and the
+    others are still reconciled.
+    """
+    report = {}
+    for collection_name, indexes in MONGO_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await collection.index_information()
+        except PyMongoError as e:
+            logger.error(f"Failed to list indexes on {collection_name}: {e}")
+            report[collection_name] = {"failed": [index.document["name"] for index in indexes]}
+            continue
+        missing = [index for index in indexes if index.document["name"] not in existing]
+        changed = [index for index in indexes if index.document["name"] in existing
+                   and not index_matches(existing[index.document["name"]], index.document)]
+        
+        try:
+            unused = [stats["name"] async for stats in collection.aggregate([{"$indexStats": {}}])
+                      if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0]
+        except OperationFailure:
+            unused = None  # $indexStats is not permitted for this user
+        
+        report[collection_name] = {
+            "missing": [index.document["name"] for index in missing],
+            "changed": [index.document["name"] for index in changed],
+            "unused": unused,
+            "failed": [],
+        }
+        if check_only:
+            continue
+        for index in missing + changed:
+            name = index.document["name"]
+            try:
+                if index in changed:
+                    await collection.drop_index(name)
+                await collection.create_indexes([index])
+            except PyMongoError as e:
+                logger.error(f"Failed to build index {name} on {collection_name}: {e}")
+                report[collection_name]["failed"].append(name)
+    return report
+
+@app.on_event("startup")
+async def create_indexes():
+    if MONGO_INDEX_MODE == "off":
+        return
+    try:
+        report = await ensure_indexes(check_only=MONGO_INDEX_MODE == "check")
+    except PyMongoError as e:
+        # e.g. MongoDB unreachable; keep serving
+        logger.error(f"Failed to reconcile MongoDB indexes: {e}")
+        return
+    for collection_name, result in report.items():
+        if any(result.values()):
+            logger.info(f"Indexes on {collection_name}: {result}")
+        # In check mode missing indexes stay missing
+        unbuilt = result["failed"] + (result.get("missing", []) if MONGO_INDEX_MODE == "check" else [])
+        if SEARCH_INDEX in unbuilt:
+            logger.warning(f"The {SEARCH_INDEX} index on {collection_name} is missing, "
+                           f"/api/search will answer 503 until it is built")
+
+@app.on_event("startup")
+async def start_suggestions():
+    # Built in the background so a large catalog does not delay startup
+    app.state.suggestions_task = asyncio.create_task(load_suggestions())
+
+@app.on_event("startup")
+async def start_discover():
+    # Only does work the first time, when the discover documents do not exist yet
+    app.state.discover_task = asyncio.create_task(load_discover())
+
+@app.on_event("startup")
+async def start_play_events():
+    play_events.start(EVENT_FLUSH_SECONDS)
+    trending.start(TRENDING_CHECKPOINT_SECONDS)
+    progress_store.start(PROGRESS_FLUSH_SECONDS)
+
+@app.on_event("startup")
+async def start_live_events():
+    live_events.start()
+
+@app.on_event("startup")
+async def start_user_cache_stats():
+    if AUTH_USER_CACHE_STATS_SECONDS > 0:
+        app.state.user_cache_stats_task = asyncio.create_task(log_user_cache_stats(AUTH_USER_CACHE_STATS_SECONDS))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await play_events.stop()
+    await trending.stop()
+    await progress_store.stop()
+    if fanout_tasks:
+        await asyncio.wait(fanout_tasks)
+    await live_events.stop()
+    if getattr(app.state, "user_cache_stats_task", None) is not None:
+        app.state.user_cache_stats_task.cancel()
     client.close()
+    password_hash_pool.shutdown(wait=False)
+    shutdown_media_pool()
+
+# Maintenance commands, e.g. `python server.py check-indexes`
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PodcastHub maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("check-indexes", help="Report missing, changed and unused MongoDB indexes")
+    commands.add_parser("ensure-indexes", help="Create missing and rebuild changed MongoDB indexes")
+    backfill = commands.add_parser("backfill-media", help="Run the media stages for existing episodes")
+    backfill.add_argument("--all", action="store_true", help="Reprocess episodes that already have metadata")
+    commands.add_parser("migrate-storage", help="Move flat uuid4 audio files into content-addressed storage")
+    commands.add_parser("rebuild-discover", help="Recompute the discover page from the catalog")
+    args = parser.parse_args(argv)
+    
+    if args.command in ("check-indexes", "ensure-indexes"):
+        report = asyncio.run(ensure_indexes(check_only=args.command == "check-indexes"))
+        print(json.dumps(report, indent=2))
+    elif args.command == "backfill-media":
+        count = asyncio.run(backfill_media(reprocess=args.all))
+        print(f"Processed {count} audio files")
+    elif args.command == "migrate-storage":
+        count = asyncio.run(migrate_storage())
+        print(f"Migrated {count} episodes")
+    elif args.command == "rebuild-discover":
+        count = asyncio.run(rebuild_discover())
+        print(f"Rebuilt the discover page with {count} categories")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,9 @@ import unittest
 import uuid
 import os
 import time
+import json
 from datetime import datetime
+from xml.etree import ElementTree
 
 # Get the backend URL from the frontend .env file
 BACKEND_URL = "https://625b12f0-45d8-4d0f-a715-a761448444da.preview.emergentagent.com"
@@ -240,6 +242,407 @@ class PodcastHubAPITester(unittest.TestCase):
         self.assertIsInstance(response.json(), list)
         print("✅ Get all episodes test passed")
 
+    def _create_podcaster_podcast(self):
+        """Register and log in a fresh podcaster, returning auth headers and a podcast ID"""
+        requests.post(f"{API_URL}/auth/register", json=self.test_user_podcaster)
+        response = requests.post(
+            f"{API_URL}/auth/login",
+            json={
+                "email": self.test_user_podcaster["email"],
+                "password": self.test_user_podcaster["password"]
+            }
+        )
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        response = requests.post(
+            f"{API_URL}/podcasts",
+            json={
+                "title": f"Test Podcast {uuid.uuid4()}",
+                "description": "This is a test podcast created by the API tester",
+                "category": "Technology"
+            },
+            headers=headers
+        )
+        return headers, response.json()["id"]
+
+    def test_15_resumable_upload(self):
+        """Test uploading an episode through a resumable upload session"""
+        print("\n🔍 Testing resumable upload session...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        audio = os.urandom(1000)
+        
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/upload-sessions",
+            json={
+                "title": "Resumable Episode",
+                "description": "Uploaded in chunks",
+                "filename": "episode.mp3",
+                "size": len(audio),
+                "chunk_size": 400
+            },
+            headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        session_id = response.json()["id"]
+        
+        # Upload the chunks out of order, then check what the server has
+        for index in (2, 0):
+            response = requests.put(
+                f"{API_URL}/upload-sessions/{session_id}/chunks/{index}",
+                data=audio[index * 400:(index + 1) * 400],
+                headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+        response = requests.get(f"{API_URL}/upload-sessions/{session_id}", headers=headers)
+        self.assertEqual(response.json()["received"], [[0, 400], [800, 1000]])
+        
+        response = requests.post(f"{API_URL}/upload-sessions/{session_id}/complete", headers=headers)
+        self.assertEqual(response.status_code, 409)
+        
+        response = requests.put(
+            f"{API_URL}/upload-sessions/{session_id}?offset=400",
+            data=audio[400:800],
+            headers=headers
+        )
+        self.assertEqual(response.json()["received"], [[0, 1000]])
+        
+        response = requests.post(f"{API_URL}/upload-sessions/{session_id}/complete", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["podcast_id"], podcast_id)
+        self.assertEqual(response.json()["size"], len(audio))
+        print("✅ Resumable upload test passed")
+
+    def test_16_episode_audio_ranges(self):
+        """Test byte-range and conditional requests for episode audio"""
+        print("\n🔍 Testing episode audio delivery...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        audio = os.urandom(4096)
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/episodes",
+            data={"title": "Range Episode", "description": "Seekable"},
+            files={"audio_file": ("episode.mp3", audio, "audio/mpeg")},
+            headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        audio_url = f"{API_URL}/episodes/{response.json()['id']}/audio"
+        
+        response = requests.get(audio_url, headers={"Range": "bytes=100-199"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["Content-Range"], f"bytes 100-199/{len(audio)}")
+        self.assertEqual(response.content, audio[100:200])
+        
+        response = requests.get(audio_url, headers={"Range": "bytes=0-9,-10"})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.headers["Content-Type"].startswith("multipart/byteranges"))
+        
+        etag = requests.head(audio_url).headers["ETag"]
+        response = requests.get(audio_url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        print("✅ Episode audio delivery test passed")
+
+    def test_17_paginated_podcasts(self):
+        """Test cursor pagination and field projection on podcast lists"""
+        print("\n🔍 Testing paginated podcast list...")
+        headers, _ = self._create_podcaster_podcast()
+        for _ in range(2):
+            requests.post(
+                f"{API_URL}/podcasts",
+                json={"title": f"Test Podcast {uuid.uuid4()}", "description": "Paged", "category": "Technology"},
+                headers=headers
+            )
+        
+        response = requests.get(f"{API_URL}/podcasts/my?limit=2&fields=title", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        first_page = response.json()
+        self.assertEqual(len(first_page), 2)
+        self.assertNotIn("description", first_page[0])
+        self.assertIn("X-Next-Cursor", response.headers)
+        
+        response = requests.get(
+            f"{API_URL}/podcasts/my",
+            params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]},
+            headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        second_page = response.json()
+        self.assertEqual(len(second_page), 1)
+        self.assertNotIn(second_page[0]["id"], [p["id"] for p in first_page])
+        self.assertNotIn("X-Next-Cursor", response.headers)
+        print("✅ Paginated podcast list test passed")
+
+    def test_18_search_suggestions(self):
+        """Test typeahead suggestions for new podcasts"""
+        print("\n🔍 Testing search suggestions...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        title = requests.get(f"{API_URL}/podcasts/{podcast_id}").json()["title"]
+        
+        response = requests.get(f"{API_URL}/search/suggest", params={"q": title[:-4]})
+        self.assertEqual(response.status_code, 200)
+        suggestion_ids = [s["id"] for s in response.json() if s["type"] == "podcast"]
+        self.assertIn(podcast_id, suggestion_ids)
+        print("✅ Search suggestions test passed")
+
+    def test_19_catalog_etag(self):
+        """Test that catalog reads revalidate with ETags until a write happens"""
+        print("\n🔍 Testing catalog ETag caching...")
+        response = requests.get(f"{API_URL}/podcasts")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        
+        response = requests.get(f"{API_URL}/podcasts", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        
+        self._create_podcaster_podcast()
+        response = requests.get(f"{API_URL}/podcasts", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        print("✅ Catalog ETag test passed")
+
+    def test_20_duplicate_upload(self):
+        """Test that identical audio is stored once, and only to uploaders who send it"""
+        print("\n🔍 Testing duplicate upload detection...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        audio = os.urandom(2048)
+        episodes = []
+        for title in ("Original", "Duplicate"):
+            response = requests.post(
+                f"{API_URL}/podcasts/{podcast_id}/episodes",
+                data={"title": title, "description": "Same audio"},
+                files={"audio_file": ("episode.mp3", audio, "audio/mpeg")},
+                headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+            episodes.append(response.json())
+        self.assertEqual(episodes[0]["audio_file"], episodes[1]["audio_file"])
+        
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/upload-sessions",
+            json={
+                "title": "Known Episode",
+                "description": "Declared by hash",
+                "filename": "episode.mp3",
+                "size": len(audio),
+                "sha256": episodes[0]["sha256"]
+            },
+            headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        session = response.json()
+        
+        # Knowing the hash is not enough, the data has to be sent
+        response = requests.post(f"{API_URL}/upload-sessions/{session['id']}/complete", headers=headers)
+        self.assertEqual(response.status_code, 409)
+        if session["upload_url"]:
+            response = requests.put(session["upload_url"], data=audio, headers=session["upload_headers"])
+        else:
+            response = requests.put(f"{API_URL}/upload-sessions/{session['id']}?offset=0", data=audio, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.post(f"{API_URL}/upload-sessions/{session['id']}/complete", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["audio_file"], episodes[0]["audio_file"])
+        print("✅ Duplicate upload test passed")
+
+    def test_21_podcast_feed(self):
+        """Test the RSS feed of a podcast and its conditional requests"""
+        print("\n🔍 Testing podcast RSS feed...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/episodes",
+            data={"title": "Feed Episode", "description": "In the feed"},
+            files={"audio_file": ("episode.mp3", os.urandom(1024), "audio/mpeg")},
+            headers=headers
+        )
+        episode_id = response.json()["id"]
+        
+        response = requests.get(f"{API_URL}/podcasts/{podcast_id}/feed.xml")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("application/rss+xml"))
+        enclosure = ElementTree.fromstring(response.content).find("channel/item/enclosure")
+        self.assertTrue(enclosure.get("url").endswith(f"/api/episodes/{episode_id}/audio"))
+        self.assertEqual(enclosure.get("length"), "1024")
+        
+        response = requests.get(
+            f"{API_URL}/podcasts/{podcast_id}/feed.xml",
+            headers={"If-None-Match": response.headers["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        print("✅ Podcast RSS feed test passed")
+
+    def test_22_discover(self):
+        """Test the aggregated discover page"""
+        print("\n🔍 Testing discover page...")
+        response = requests.get(f"{API_URL}/discover")
+        self.assertEqual(response.status_code, 200)
+        podcast_count = response.json()["podcast_count"]
+        
+        _, podcast_id = self._create_podcaster_podcast()
+        response = requests.get(f"{API_URL}/discover")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreater(data["podcast_count"], podcast_count)
+        technology = [bucket for bucket in data["categories"] if bucket["category"] == "Technology"]
+        self.assertIn(podcast_id, [podcast["id"] for podcast in technology[0]["podcasts"]])
+        print("✅ Discover page test passed")
+
+    def test_23_batched_podcasts(self):
+        """Test fetching several podcasts with their episodes in one request"""
+        print("\n🔍 Testing batched podcast retrieval...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        _, other_id = self._create_podcaster_podcast()
+        for index in range(3):
+            requests.post(
+                f"{API_URL}/podcasts/{podcast_id}/episodes",
+                data={"title": f"Batched Episode {index}", "description": "Embedded"},
+                files={"audio_file": ("episode.mp3", os.urandom(512), "audio/mpeg")},
+                headers=headers
+            )
+        
+        response = requests.get(
+            f"{API_URL}/podcasts",
+            params={"ids": f"{podcast_id},{other_id}", "include": "episodes", "episodes_limit": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        podcasts = {podcast["id"]: podcast for podcast in response.json()}
+        self.assertEqual(set(podcasts), {podcast_id, other_id})
+        self.assertEqual([episode["title"] for episode in podcasts[podcast_id]["episodes"]],
+                         ["Batched Episode 2", "Batched Episode 1"])
+        self.assertEqual(podcasts[other_id]["episodes"], [])
+        print("✅ Batched podcast retrieval test passed")
+
+    def test_24_play_events(self):
+        """Test that play events are counted once they have been written behind"""
+        print("\n🔍 Testing play event ingestion...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/episodes",
+            data={"title": "Counted Episode", "description": "Played"},
+            files={"audio_file": ("episode.mp3", os.urandom(512), "audio/mpeg")},
+            headers=headers
+        )
+        episode_id = response.json()["id"]
+        
+        response = requests.post(f"{API_URL}/episodes/{episode_id}/events", json={"type": "play"})
+        self.assertEqual(response.status_code, 202)
+        response = requests.post(
+            f"{API_URL}/episodes/{episode_id}/events",
+            json=[{"type": "progress", "listened": 30}, {"type": "complete", "listened": 15}]
+        )
+        self.assertEqual(response.status_code, 202)
+        response = requests.post(f"{API_URL}/episodes/{uuid.uuid4()}/events", json={"type": "play"})
+        self.assertEqual(response.status_code, 404)
+        response = requests.post(f"{API_URL}/episodes/{episode_id}/events", json=[{"type": "play"}] * 1000)
+        self.assertEqual(response.status_code, 422)
+        
+        time.sleep(6)  # events are flushed every EVENT_FLUSH_SECONDS
+        response = requests.get(f"{API_URL}/episodes/{episode_id}/stats", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual((stats["plays"], stats["completes"], stats["listened"]), (1, 1, 45))
+        print("✅ Play event ingestion test passed")
+
+    def test_25_trending(self):
+        """Test the trending podcasts and episodes ranking"""
+        print("\n🔍 Testing trending ranking...")
+        response = requests.get(f"{API_URL}/trending", params={"category": "Technology", "limit": 5})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertLessEqual(len(data["podcasts"]), 5)
+        for podcast in data["podcasts"]:
+            self.assertEqual(podcast["category"], "Technology")
+        scores = [episode["score"] for episode in data["episodes"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        print("✅ Trending ranking test passed")
+
+    def test_26_playback_progress(self):
+        """Test that the newest playback position wins"""
+        print("\n🔍 Testing playback progress sync...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/episodes",
+            data={"title": "Resumed Episode", "description": "Half listened"},
+            files={"audio_file": ("episode.mp3", os.urandom(512), "audio/mpeg")},
+            headers=headers
+        )
+        episode_id = response.json()["id"]
+        url = f"{API_URL}/me/progress/{episode_id}"
+        
+        response = requests.get(url, headers=headers)
+        self.assertEqual(response.status_code, 404)
+        response = requests.put(url, json={"position": 120.5, "updated_at": "2030-01-01T00:00:00Z"}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.put(url, json={"position": 10, "updated_at": "2020-01-01T00:00:00Z"}, headers=headers)
+        self.assertEqual(response.json()["position"], 120.5)
+        
+        response = requests.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["position"], 120.5)
+        print("✅ Playback progress sync test passed")
+
+    def test_27_subscription_inbox(self):
+        """Test that new episodes reach subscribers' inboxes"""
+        print("\n🔍 Testing subscriptions and inbox...")
+        headers, podcast_id = self._create_podcaster_podcast()
+        requests.post(f"{API_URL}/auth/register", json=self.test_user_listener)
+        response = requests.post(
+            f"{API_URL}/auth/login",
+            json={
+                "email": self.test_user_listener["email"],
+                "password": self.test_user_listener["password"]
+            }
+        )
+        listener_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        
+        response = requests.put(f"{API_URL}/podcasts/{podcast_id}/subscription", headers=listener_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["podcast_id"], podcast_id)
+        response = requests.post(
+            f"{API_URL}/podcasts/{podcast_id}/episodes",
+            data={"title": "Inbox Episode", "description": "For subscribers"},
+            files={"audio_file": ("episode.mp3", os.urandom(512), "audio/mpeg")},
+            headers=headers
+        )
+        episode_id = response.json()["id"]
+        
+        time.sleep(1)  # inboxes are filled in the background
+        response = requests.get(f"{API_URL}/me/inbox", headers=listener_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["id"], episode_id)
+        
+        response = requests.delete(f"{API_URL}/podcasts/{podcast_id}/subscription", headers=listener_headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f"{API_URL}/me/inbox", headers=listener_headers)
+        self.assertNotIn(episode_id, [episode["id"] for episode in response.json()])
+        print("✅ Subscriptions and inbox test passed")
+
+    def test_28_event_stream(self):
+        """Test that new podcasts are pushed over the event stream"""
+        print("\n🔍 Testing live event stream...")
+        response = requests.get(f"{API_URL}/events/stream", stream=True, timeout=10)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/event-stream"))
+        
+        _, podcast_id = self._create_podcaster_podcast()
+        events = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                events.append(line[len("event: "):])
+            elif line.startswith("data: ") and events[-1] == "podcast_created":
+                if json.loads(line[len("data: "):])["id"] == podcast_id:
+                    break
+        response.close()
+        self.assertIn("podcast_created", events)
+        print("✅ Live event stream test passed")
+
+    def test_29_rate_limit(self):
+        """Test that a client searching too fast is told to back off"""
+        print("\n🔍 Testing rate limiting...")
+        for _ in range(100):
+            response = requests.get(f"{API_URL}/search", params={"q": "test"})
+            if response.status_code != 200:
+                break
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        print("✅ Rate limiting test passed")
+
 def run_tests():
     # Create a test suite
     suite = unittest.TestSuite()
@@ -260,7 +663,22 @@ def run_tests():
         'test_11_search',
         'test_12_listener_cannot_create_podcast',
         'test_13_get_episodes',
-        'test_14_get_all_episodes'
+        'test_14_get_all_episodes',
+        'test_15_resumable_upload',
+        'test_16_episode_audio_ranges',
+        'test_17_paginated_podcasts',
+        'test_18_search_suggestions',
+        'test_19_catalog_etag',
+        'test_20_duplicate_upload',
+        'test_21_podcast_feed',
+        'test_22_discover',
+        'test_23_batched_podcasts',
+        'test_24_play_events',
+        'test_25_trending',
+        'test_26_playback_progress',
+        'test_27_subscription_inbox',
+        'test_28_event_stream',
+        'test_29_rate_limit'
     ]
     
     for test_name in test_names:
@@ -1,6 +1,9 @@
 #!/bin/sh
 set -e
 
+# Every open event stream holds file descriptors in both uvicorn and nginx
+ulimit -n 65536 2>/dev/null || echo "Could not raise the open file limit, staying at $(ulimit -n)"
+
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
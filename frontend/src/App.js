@@ -5,6 +5,13 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Episodes fetched per request when listing a podcast
+const EPISODE_PAGE_SIZE = 50;
+// Newest episodes embedded in each podcast of the dashboard, the rest are fetched on expand
+const EPISODE_PREVIEW_SIZE = 5;
+// Podcasts fetched per request when a Browse category is expanded
+const PODCAST_PAGE_SIZE = 50;
+
 // Set up axios defaults
 axios.defaults.headers.common['Content-Type'] = 'application/json';
 
@@ -373,6 +380,7 @@ const RegisterPage = ({ setCurrentPage }) => {
 // Dashboard
 const Dashboard = ({ user }) => {
   const [podcasts, setPodcasts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -383,10 +391,13 @@ const Dashboard = ({ user }) => {
     }
   }, [user]);
 
-  const fetchMyPodcasts = async () => {
+  const fetchMyPodcasts = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API}/podcasts/my`);
-      setPodcasts(response.data);
+      const response = await axios.get(`${API}/podcasts/my`, {
+        params: { include: 'episodes', episodes_limit: EPISODE_PREVIEW_SIZE, cursor: cursor || undefined }
+      });
+      setPodcasts(previous => cursor ? [...previous, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Failed to fetch podcasts:', error);
     }
@@ -404,7 +415,11 @@ const Dashboard = ({ user }) => {
       </h2>
       
       {user.role === 'podcaster' ? (
-        <PodcasterDashboard podcasts={podcasts} fetchMyPodcasts={fetchMyPodcasts} />
+        <PodcasterDashboard
+          podcasts={podcasts}
+          fetchMyPodcasts={() => fetchMyPodcasts()}
+          loadMore={nextCursor && (() => fetchMyPodcasts(nextCursor))}
+        />
       ) : (
         <ListenerDashboard />
       )}
@@ -413,7 +428,7 @@ const Dashboard = ({ user }) => {
 };
 
 // Podcaster Dashboard
-const PodcasterDashboard = ({ podcasts, fetchMyPodcasts }) => {
+const PodcasterDashboard = ({ podcasts, fetchMyPodcasts, loadMore }) => {
   const [showCreateForm, setShowCreateForm] = useState(false);
   const [showEpisodeForm, setShowEpisodeForm] = useState(null);
 
@@ -458,6 +473,12 @@ const PodcasterDashboard = ({ podcasts, fetchMyPodcasts }) => {
         ))}
       </div>
 
+      {loadMore && (
+        <button onClick={loadMore} className="mt-6 w-full bg-gray-700 hover:bg-gray-600 py-2 rounded">
+          Load More Podcasts
+        </button>
+      )}
+
       {podcasts.length === 0 && (
         <div className="text-center text-gray-400 py-12">
           <p>You haven't created any podcasts yet.</p>
@@ -483,28 +504,67 @@ const ListenerDashboard = () => {
 
 // Browse Page
 const BrowsePage = () => {
-  const [podcasts, setPodcasts] = useState([]);
+  const [categories, setCategories] = useState([]);
   const [episodes, setEpisodes] = useState([]);
+  // Next page cursor of each category expanded past its discover bucket
+  const [cursors, setCursors] = useState({});
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetchContent();
+
+    // New podcasts and episodes are pushed by the server instead of refetched
+    const events = new EventSource(`${API}/events/stream`);
+    events.addEventListener('podcast_created', (event) => {
+      const podcast = JSON.parse(event.data);
+      setCategories(current => {
+        if (!current.some(bucket => bucket.category === podcast.category)) {
+          return [...current, { category: podcast.category, count: 1, podcasts: [podcast] }];
+        }
+        return current.map(bucket => bucket.category === podcast.category
+          ? {
+              ...bucket,
+              count: bucket.count + 1,
+              podcasts: bucket.expanded
+                ? [podcast, ...bucket.podcasts]
+                : [podcast, ...bucket.podcasts].slice(0, bucket.podcasts.length || 1)
+            }
+          : bucket);
+      });
+    });
+    events.addEventListener('episode_created', (event) => {
+      const episode = JSON.parse(event.data);
+      setEpisodes(current => [episode, ...current].slice(0, Math.max(current.length, 1)));
+    });
+    return () => events.close();
   }, []);
 
   const fetchContent = async () => {
     try {
-      const [podcastsRes, episodesRes] = await Promise.all([
-        axios.get(`${API}/podcasts`),
-        axios.get(`${API}/episodes`)
-      ]);
-      setPodcasts(podcastsRes.data);
-      setEpisodes(episodesRes.data);
+      const response = await axios.get(`${API}/discover`);
+      setCategories(response.data.categories);
+      setEpisodes(response.data.latest_episodes);
     } catch (error) {
       console.error('Failed to fetch content:', error);
     }
     setLoading(false);
   };
 
+  // The first page replaces the discover bucket, later ones are appended
+  const fetchCategory = async (category, cursor = null) => {
+    try {
+      const response = await axios.get(`${API}/podcasts`, {
+        params: { category, limit: PODCAST_PAGE_SIZE, cursor: cursor || undefined }
+      });
+      setCategories(current => current.map(bucket => bucket.category === category
+        ? { ...bucket, expanded: true, podcasts: cursor ? [...bucket.podcasts, ...response.data] : response.data }
+        : bucket));
+      setCursors(current => ({ ...current, [category]: response.headers['x-next-cursor'] || null }));
+    } catch (error) {
+      console.error('Failed to fetch podcasts:', error);
+    }
+  };
+
   if (loading) {
     return <div className="text-center">Loading...</div>;
   }
@@ -513,19 +573,31 @@ const BrowsePage = () => {
     <div>
       <h2 className="text-3xl font-bold mb-6 text-purple-400">Browse Podcasts</h2>
       
-      <div className="mb-8">
-        <h3 className="text-2xl font-semibold mb-4">All Podcasts</h3>
-        <div className="grid gap-6">
-          {podcasts.map(podcast => (
-            <PodcastCard key={podcast.id} podcast={podcast} isOwner={false} />
-          ))}
+      {categories.map(bucket => (
+        <div key={bucket.category} className="mb-8">
+          <h3 className="text-2xl font-semibold mb-4">
+            {bucket.category} <span className="text-gray-400 text-lg">({bucket.count})</span>
+          </h3>
+          <div className="grid gap-6">
+            {bucket.podcasts.map(podcast => (
+              <PodcastCard key={podcast.id} podcast={podcast} isOwner={false} />
+            ))}
+          </div>
+          {(bucket.expanded ? cursors[bucket.category] : bucket.count > bucket.podcasts.length) && (
+            <button
+              onClick={() => fetchCategory(bucket.category, cursors[bucket.category])}
+              className="mt-4 w-full bg-gray-700 hover:bg-gray-600 py-2 rounded"
+            >
+              {bucket.expanded ? 'Load More' : `View all ${bucket.count}`}
+            </button>
+          )}
         </div>
-      </div>
+      ))}
 
       <div>
         <h3 className="text-2xl font-semibold mb-4">Latest Episodes</h3>
         <div className="grid gap-4">
-          {episodes.slice(0, 10).map(episode => (
+          {episodes.map(episode => (
             <EpisodeCard key={episode.id} episode={episode} />
           ))}
         </div>
@@ -535,18 +607,43 @@ const BrowsePage = () => {
 };
 
 // Search Page
+// Wait this long after the last keystroke before asking for suggestions
+const SUGGEST_DELAY = 200;
+
 const SearchPage = () => {
   const [searchQuery, setSearchQuery] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
+  const [showSuggestions, setShowSuggestions] = useState(false);
   const [results, setResults] = useState({ podcasts: [], episodes: [] });
   const [loading, setLoading] = useState(false);
 
-  const handleSearch = async (e) => {
-    e.preventDefault();
-    if (!searchQuery.trim()) return;
+  useEffect(() => {
+    if (!showSuggestions || !searchQuery.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/search/suggest`, { params: { q: searchQuery, limit: 8 } });
+        if (!cancelled) setSuggestions(response.data);
+      } catch (error) {
+        console.error('Failed to fetch suggestions:', error);
+      }
+    }, SUGGEST_DELAY);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, showSuggestions]);
+
+  const runSearch = async (query) => {
+    setShowSuggestions(false);
+    if (!query.trim()) return;
 
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/search?q=${encodeURIComponent(searchQuery)}`);
+      const response = await axios.get(`${API}/search?q=${encodeURIComponent(query)}`);
       setResults(response.data);
     } catch (error) {
       console.error('Search failed:', error);
@@ -554,19 +651,51 @@ const SearchPage = () => {
     setLoading(false);
   };
 
+  const handleSearch = (e) => {
+    e.preventDefault();
+    runSearch(searchQuery);
+  };
+
+  const selectSuggestion = (suggestion) => {
+    setSearchQuery(suggestion.text);
+    runSearch(suggestion.text);
+  };
+
   return (
     <div>
       <h2 className="text-3xl font-bold mb-6 text-purple-400">Search</h2>
       
       <form onSubmit={handleSearch} className="mb-8">
         <div className="flex gap-4">
-          <input
-            type="text"
-            value={searchQuery}
-            onChange={(e) => setSearchQuery(e.target.value)}
-            placeholder="Search for podcasts or episodes..."
-            className="flex-1 p-3 bg-gray-700 text-white rounded border border-gray-600 focus:border-purple-500"
-          />
+          <div className="flex-1 relative">
+            <input
+              type="text"
+              value={searchQuery}
+              onChange={(e) => {
+                setSearchQuery(e.target.value);
+                setShowSuggestions(true);
+              }}
+              onKeyDown={(e) => e.key === 'Escape' && setShowSuggestions(false)}
+              placeholder="Search for podcasts or episodes..."
+              className="w-full p-3 bg-gray-700 text-white rounded border border-gray-600 focus:border-purple-500"
+            />
+            {showSuggestions && suggestions.length > 0 && (
+              <ul className="absolute z-10 w-full mt-1 bg-gray-700 border border-gray-600 rounded shadow-lg">
+                {suggestions.map(suggestion => (
+                  <li key={`${suggestion.type}:${suggestion.id}`}>
+                    <button
+                      type="button"
+                      onClick={() => selectSuggestion(suggestion)}
+                      className="w-full flex justify-between px-3 py-2 text-left hover:bg-gray-600"
+                    >
+                      <span>{suggestion.text}</span>
+                      <span className="text-gray-400 text-sm">{suggestion.type}</span>
+                    </button>
+                  </li>
+                ))}
+              </ul>
+            )}
+          </div>
           <button
             type="submit"
             disabled={loading}
@@ -791,12 +920,22 @@ const CreateEpisodeForm = ({ podcastId, onClose, onSuccess }) => {
 // Podcast Card Component
 const PodcastCard = ({ podcast, onAddEpisode, isOwner }) => {
   const [episodes, setEpisodes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [showEpisodes, setShowEpisodes] = useState(false);
 
-  const fetchEpisodes = async () => {
+  const fetchEpisodes = async (cursor = null) => {
+    // Embedded episodes carry no cursor, so only use them when they are all there are
+    if (!cursor && podcast.episodes && podcast.episodes.length < EPISODE_PREVIEW_SIZE) {
+      setEpisodes(podcast.episodes);
+      setShowEpisodes(true);
+      return;
+    }
     try {
-      const response = await axios.get(`${API}/podcasts/${podcast.id}/episodes`);
-      setEpisodes(response.data);
+      const response = await axios.get(`${API}/podcasts/${podcast.id}/episodes`, {
+        params: { limit: EPISODE_PAGE_SIZE, cursor: cursor || undefined }
+      });
+      setEpisodes(previous => cursor ? [...previous, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
       setShowEpisodes(true);
     } catch (error) {
       console.error('Failed to fetch episodes:', error);
@@ -824,7 +963,7 @@ const PodcastCard = ({ podcast, onAddEpisode, isOwner }) => {
             </button>
           )}
           <button
-            onClick={fetchEpisodes}
+            onClick={() => fetchEpisodes()}
             className="bg-purple-600 hover:bg-purple-700 px-4 py-2 rounded text-sm"
           >
             View Episodes
@@ -834,7 +973,7 @@ const PodcastCard = ({ podcast, onAddEpisode, isOwner }) => {
       
       {showEpisodes && (
         <div className="mt-6 pt-4 border-t border-gray-700">
-          <h5 className="text-lg font-semibold mb-3">Episodes ({episodes.length})</h5>
+          <h5 className="text-lg font-semibold mb-3">Episodes ({episodes.length}{nextCursor ? '+' : ''})</h5>
           {episodes.length > 0 ? (
             <div className="space-y-3">
               {episodes.map(episode => (
@@ -844,16 +983,61 @@ const PodcastCard = ({ podcast, onAddEpisode, isOwner }) => {
           ) : (
             <p className="text-gray-400">No episodes yet.</p>
           )}
+          {nextCursor && (
+            <button
+              onClick={() => fetchEpisodes(nextCursor)}
+              className="mt-3 w-full bg-gray-700 hover:bg-gray-600 py-2 rounded text-sm"
+            >
+              Load More Episodes
+            </button>
+          )}
         </div>
       )}
     </div>
   );
 };
 
+// How often the playback position is saved while an episode plays
+const PROGRESS_SAVE_INTERVAL = 10000;
+
 // Episode Card Component
 const EpisodeCard = ({ episode, compact }) => {
+  const { user } = React.useContext(AuthContext);
   const [isPlaying, setIsPlaying] = useState(false);
   const audioRef = useRef(null);
+  const lastSavedRef = useRef(0);
+
+  const restoreProgress = async () => {
+    if (!user) return;
+    try {
+      const response = await axios.get(`${API}/me/progress/${episode.id}`);
+      if (audioRef.current && !response.data.completed) {
+        audioRef.current.currentTime = response.data.position;
+      }
+    } catch (error) {
+      // Nothing saved yet
+    }
+  };
+
+  const saveProgress = async (completed = false) => {
+    if (!user || !audioRef.current) return;
+    lastSavedRef.current = Date.now();
+    try {
+      await axios.put(`${API}/me/progress/${episode.id}`, {
+        position: audioRef.current.currentTime,
+        completed,
+        updated_at: new Date().toISOString()
+      });
+    } catch (error) {
+      console.error('Failed to save progress:', error);
+    }
+  };
+
+  const handleTimeUpdate = () => {
+    if (isPlaying && Date.now() - lastSavedRef.current >= PROGRESS_SAVE_INTERVAL) {
+      saveProgress();
+    }
+  };
 
   const togglePlayPause = () => {
     if (audioRef.current) {
@@ -905,7 +1089,11 @@ const EpisodeCard = ({ episode, compact }) => {
       <audio
         ref={audioRef}
         src={`${BACKEND_URL}/api/uploads/${episode.audio_file}`}
-        onEnded={() => setIsPlaying(false)}
+        onLoadedMetadata={restoreProgress}
+        onTimeUpdate={handleTimeUpdate}
+        onPlay={() => setIsPlaying(true)}
+        onPause={() => { setIsPlaying(false); saveProgress(); }}
+        onEnded={() => { setIsPlaying(false); saveProgress(true); }}
         controls
         className="w-full mt-4"
       />
@@ -0,0 +1,72 @@
+"""Benchmark play event ingestion: events/s into POST /api/episodes/{id}/events.
+
+Sends --events progress events spread over --episodes small episodes,
+--batch per request and --concurrency requests at a time, then waits for the
+write-behind flush and checks that the counters add up. Point it at a single
+worker to see what one process sustains:
+
+    RATE_LIMIT_RATE=0 uvicorn server:app --port 8001 --workers 1 &
+    python scripts/bench_events.py --pid $! --events 200000 --batch 20
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchlib import RssSampler, Timer, argument_parser, create_podcast, latency_summary, register, upload_episode
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000, help="number of events (default: 100000)")
+    parser.add_argument("--batch", type=int, default=10, help="events per request, 1 sends bare events (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once (default: 32)")
+    parser.add_argument("--episodes", type=int, default=10, help="episodes the events go to (default: 10)")
+    parser.add_argument("--flush-wait", type=float, default=10, help="seconds to wait for counters (default: 10)")
+    args = parser.parse_args()
+
+    api_url = f"{args.url}/api"
+    _, headers = register(api_url)
+    podcast_id = create_podcast(api_url, headers)
+    episode_ids = [upload_episode(api_url, headers, podcast_id, 1024)["id"] for _ in range(args.episodes)]
+    requests_count = args.events // args.batch
+    event = {"type": "progress", "listened": 10}
+    body = event if args.batch == 1 else [event] * args.batch
+    local = threading.local()
+
+    def send(index):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        with Timer() as timer:
+            response = local.session.post(f"{api_url}/episodes/{episode_ids[index % len(episode_ids)]}/events",
+                                          json=body)
+        return response.status_code, timer.elapsed
+
+    print(f"{requests_count * args.batch} events in batches of {args.batch}, {args.concurrency} requests at a time")
+    with RssSampler(args.pid) as rss, Timer() as total, ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(send, range(requests_count)))
+    statuses = Counter(status for status, _ in results)
+    accepted = statuses[202] * args.batch
+    print(f"{accepted / total.elapsed:,.0f} events/s, {requests_count / total.elapsed:,.0f} requests/s, "
+          f"statuses {dict(statuses)}")
+    print(f"request latency: {latency_summary([latency for _, latency in results])}")
+    print(rss.report())
+
+    # Counters are written behind, so poll until they reach the accepted total
+    deadline = time.monotonic() + args.flush_wait
+    while True:
+        progress = 0
+        for episode_id in episode_ids:
+            response = requests.get(f"{api_url}/episodes/{episode_id}/stats", headers=headers)
+            response.raise_for_status()
+            progress += response.json()["progress"]
+        if progress >= accepted or time.monotonic() > deadline:
+            break
+        time.sleep(0.5)
+    print(f"stored progress events: {progress} of {accepted} accepted")
+
+
+if __name__ == "__main__":
+    main()
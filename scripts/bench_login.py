@@ -0,0 +1,80 @@
+"""Benchmark a login storm: latency of unrelated requests while bcrypt runs.
+
+Measures GET / on its own for --baseline-seconds, then again while
+--logins logins run --concurrency at a time. Password hashing runs off the
+event loop, so the probe's p99 should barely move while logins queue up or
+get a 503 once PASSWORD_HASH_QUEUE_LIMIT is reached:
+
+    python scripts/bench_login.py --logins 500 --concurrency 64
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchlib import RssSampler, Timer, argument_parser, latency_summary, register
+
+
+class Probe(threading.Thread):
+    """Requests ``url`` every ``interval`` seconds until stopped, recording latencies."""
+
+    def __init__(self, url: str, interval: float):
+        super().__init__(daemon=True)
+        self.url = url
+        self.interval = interval
+        self.latencies = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        with requests.Session() as session:
+            while not self.stopped.wait(self.interval):
+                with Timer() as timer:
+                    session.get(self.url).raise_for_status()
+                self.latencies.append(timer.elapsed)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.join()
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=500, help="number of logins (default: 500)")
+    parser.add_argument("--concurrency", type=int, default=64, help="logins in flight at once (default: 64)")
+    parser.add_argument("--baseline-seconds", type=float, default=3, help="probe-only warm up (default: 3)")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="seconds between probes (default: 0.01)")
+    args = parser.parse_args()
+
+    api_url = f"{args.url}/api"
+    password = "BenchPassword123!"
+    email, _ = register(api_url, role="listener", password=password)
+
+    with Probe(f"{args.url}/", args.probe_interval) as baseline:
+        time.sleep(args.baseline_seconds)
+    print(f"GET / alone: {latency_summary(baseline.latencies)}")
+
+    def login(_):
+        with Timer() as timer:
+            response = requests.post(f"{api_url}/auth/login", json={"email": email, "password": password})
+        return response.status_code, timer.elapsed
+
+    with RssSampler(args.pid) as rss, Probe(f"{args.url}/", args.probe_interval) as storm, Timer() as total, \
+            ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(login, range(args.logins)))
+    statuses = Counter(status for status, _ in results)
+    accepted = [latency for status, latency in results if status == 200]
+    print(f"GET / during {args.logins} logins: {latency_summary(storm.latencies)}")
+    print(f"logins: {dict(statuses)} in {total.elapsed:.1f} s, {len(accepted) / total.elapsed:.1f} logins/s")
+    if accepted:
+        print(f"successful login latency: {latency_summary(accepted)}")
+    print(rss.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark waveform peaks: compute_peaks on a long WAV, then read_peaks.
+
+Writes a --minutes long 16-bit WAV (two hours of 44.1 kHz stereo is about
+1.2 GiB, so point --dir at a disk with room), runs the peaks stage on it the
+way the media pool does, and times a few zoomed reads. Runs in-process, no
+server needed:
+
+    python scripts/bench_peaks.py --minutes 120 --dir /var/tmp
+"""
+import argparse
+import resource
+import tempfile
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from benchlib import Timer, mib, import_server
+
+server = import_server()
+
+
+def write_wav(path: Path, minutes: float, sample_rate: int, channels: int):
+    """Write a tone with noise, a minute at a time."""
+    rng = np.random.default_rng(0)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for minute in range(int(np.ceil(minutes))):
+            frames = int(min(1, minutes - minute) * 60 * sample_rate)
+            t = np.arange(frames) / sample_rate + minute * 60
+            signal = 0.5 * np.sin(2 * np.pi * 220 * t) * np.sin(2 * np.pi * t / 30) + 0.1 * rng.standard_normal(frames)
+            samples = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+            f.writeframes(np.repeat(samples, channels).tobytes())
+
+
+def max_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=120, help="length of the WAV (default: 120)")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="sample rate in Hz (default: 44100)")
+    parser.add_argument("--channels", type=int, default=2, help="channel count (default: 2)")
+    parser.add_argument("--dir", help="where to write the WAV (default: the system temp directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        path = Path(directory) / "episode.wav"
+        with Timer() as timer:
+            write_wav(path, args.minutes, args.sample_rate, args.channels)
+        print(f"wrote {mib(path.stat().st_size):.0f} MiB of WAV in {timer.elapsed:.1f} s")
+
+        rss_before = max_rss()
+        with Timer() as timer:
+            server.compute_peaks(str(path))
+        peaks = server.peaks_path(path)
+        print(f"compute_peaks: {timer.elapsed:.2f} s, {args.minutes * 60 / timer.elapsed:.0f}x realtime, "
+              f"{mib(path.stat().st_size) / timer.elapsed:.0f} MiB/s")
+        print(f"peak RSS grew by {mib(max(max_rss() - rss_before, 0)):.1f} MiB "
+              f"(process peak {mib(max_rss()):.1f} MiB)")
+        print(f"peaks file: {peaks.stat().st_size / 1024:.0f} KiB, {server.PEAKS_LEVELS} levels")
+
+        duration = args.minutes * 60
+        for zoom, start, end in ((server.PEAKS_LEVELS - 1, 0, None), (0, 0, None), (0, duration / 2, duration / 2 + 60)):
+            with Timer() as timer:
+                for _ in range(100):
+                    _, samples_per_bucket, _, data = server.read_peaks(peaks, zoom, start, end)
+            print(f"read_peaks zoom={zoom} start={start:.0f} end={end}: {len(data) // 2} buckets of "
+                  f"{samples_per_bucket} samples, {timer.elapsed * 10:.2f} ms per read")
+
+
+if __name__ == "__main__":
+    main()
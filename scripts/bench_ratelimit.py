@@ -0,0 +1,88 @@
+"""Benchmark the rate limiting middleware's overhead per request.
+
+Calls an empty ASGI app directly, bare and wrapped in RateLimitMiddleware,
+for anonymous clients keyed by IP, for bearer tokens and for an expensive
+route, and reports the added microseconds per request. Buckets are sized so
+nothing is rejected. Runs in-process; --redis measures RedisRateLimiter
+against a running Redis instead of the in-memory buckets:
+
+    python scripts/bench_ratelimit.py --requests 200000 --clients 10000
+"""
+import argparse
+import asyncio
+
+from benchlib import Timer, import_server
+
+server = import_server()
+
+UNLIMITED = 1e12
+
+
+async def empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    if message["type"] == "http.response.start" and message["status"] != 200:
+        raise RuntimeError(f"request rejected with {message['status']}")
+
+
+def scopes(count: int, clients: int, method: str, path: str, tokens=None) -> list:
+    result = []
+    for index in range(count):
+        headers = [(b"host", b"bench"), (b"user-agent", b"bench")]
+        if tokens:
+            headers.append((b"authorization", b"Bearer " + tokens[index % len(tokens)]))
+        result.append({
+            "type": "http", "method": method, "path": path, "headers": headers,
+            "client": (f"10.{index % clients // 65536}.{index % clients // 256 % 256}.{index % clients % 256}", 5000),
+        })
+    return result
+
+
+async def time_requests(app, requests: list) -> float:
+    with Timer() as timer:
+        for scope in requests:
+            await app(scope, receive, send)
+    return timer.elapsed / len(requests)
+
+
+async def run(args):
+    if args.redis:
+        limiter = server.RedisRateLimiter(args.redis, UNLIMITED, UNLIMITED)
+    else:
+        limiter = server.MemoryRateLimiter(UNLIMITED, UNLIMITED, server.RATE_LIMIT_CLIENTS)
+    middleware = server.RateLimitMiddleware(empty_app, limiter, max_expensive=UNLIMITED)
+    tokens = [server.create_access_token({"sub": f"bench{index}@bench.test"}).encode()
+              for index in range(min(args.clients, 10000))]
+    cases = [
+        ("anonymous GET /api/podcasts", scopes(args.requests, args.clients, "GET", "/api/podcasts")),
+        ("bearer GET /api/podcasts", scopes(args.requests, args.clients, "GET", "/api/podcasts", tokens)),
+        ("anonymous POST /api/auth/login", scopes(args.requests, args.clients, "POST", "/api/auth/login")),
+    ]
+    print(f"{args.requests} requests from {args.clients} clients, "
+          f"{'RedisRateLimiter' if args.redis else 'MemoryRateLimiter'}")
+    for name, requests in cases:
+        # The first pass fills the buckets and the token cache
+        await time_requests(middleware, requests)
+        bare = await time_requests(empty_app, requests)
+        wrapped = await time_requests(middleware, requests)
+        print(f"{name}: {bare * 1e6:.2f} us bare, {wrapped * 1e6:.2f} us with the middleware, "
+              f"+{(wrapped - bare) * 1e6:.2f} us per request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000, help="requests per case (default: 200000)")
+    parser.add_argument("--clients", type=int, default=10000, help="distinct clients (default: 10000)")
+    parser.add_argument("--redis", help="Redis URL, to measure RedisRateLimiter")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
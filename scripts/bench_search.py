@@ -0,0 +1,122 @@
+"""Benchmark /api/search over a large synthetic episode corpus.
+
+Creates a podcast through the API, inserts --episodes episodes for it
+straight into the server's database (MONGO_URL and DB_NAME, as in
+backend/.env), then sends --queries searches for one or two words,
+--concurrency at a time. Words follow a Zipf distribution, and queries are
+split between common and rare terms. The text indexes must exist, which the
+server ensures at startup:
+
+    RATE_LIMIT_RATE=0 uvicorn server:app --port 8001 &
+    MONGO_URL=... DB_NAME=... python scripts/bench_search.py --episodes 1000000
+
+Seeding a million episodes takes a few minutes; pass --podcast to query a
+corpus seeded by an earlier run and --drop to delete it afterwards.
+"""
+import itertools
+import os
+import random
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from pymongo import MongoClient
+
+from benchlib import RssSampler, Timer, argument_parser, create_podcast, latency_summary, register
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "be", "do", "fa", "gu", "hi", "ju", "pe", "so"]
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed_episodes(collection, podcast_id: str, count: int, words: list, rng: random.Random, batch: int = 10000):
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    started = datetime.utcnow() - timedelta(days=365)
+    for first in range(0, count, batch):
+        documents = []
+        for index in range(first, min(first + batch, count)):
+            documents.append({
+                "id": str(uuid.uuid4()),
+                "podcast_id": podcast_id,
+                "title": " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(3, 8))),
+                "description": " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(15, 40))),
+                "audio_file": f"bench/{index}.mp3",
+                "duration": rng.randint(300, 7200),
+                "size": rng.randint(5, 200) * 1024 * 1024,
+                "hls": False,
+                "peaks": False,
+                "created_at": started + timedelta(seconds=index * 30),
+            })
+        collection.insert_many(documents, ordered=False)
+        print(f"\rseeded {first + len(documents)} of {count} episodes", end="", flush=True)
+    print()
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--episodes", type=int, default=1000000, help="episodes to seed (default: 1000000)")
+    parser.add_argument("--podcast", help="query the corpus already seeded for this podcast id")
+    parser.add_argument("--queries", type=int, default=2000, help="number of searches (default: 2000)")
+    parser.add_argument("--concurrency", type=int, default=16, help="searches in flight at once (default: 16)")
+    parser.add_argument("--limit", type=int, default=20, help="results per list (default: 20)")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="distinct words (default: 20000)")
+    parser.add_argument("--drop", action="store_true", help="delete the seeded episodes afterwards")
+    args = parser.parse_args()
+
+    api_url = f"{args.url}/api"
+    database = MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+    rng = random.Random(0)  # the same vocabulary on every run, so --podcast corpora stay searchable
+    words = vocabulary(args.vocabulary, rng)
+    podcast_id = args.podcast
+    if podcast_id is None:
+        _, headers = register(api_url)
+        podcast_id = create_podcast(api_url, headers)
+        with Timer() as timer:
+            seed_episodes(database.episodes, podcast_id, args.episodes, words, rng)
+        print(f"seeded in {timer.elapsed:.0f} s, corpus podcast id {podcast_id}")
+    print(f"{database.episodes.estimated_document_count()} episodes in the collection")
+
+    # Half the queries lead with one of the 100 most frequent words
+    queries = []
+    for _ in range(args.queries):
+        rank = rng.randrange(100) if rng.random() < 0.5 else rng.randrange(100, len(words))
+        terms = [words[rank]] + ([rng.choice(words)] if rng.random() < 0.3 else [])
+        queries.append((" ".join(terms), "common" if rank < 100 else "rare"))
+    local = threading.local()
+
+    def search(query):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        text, kind = query
+        with Timer() as timer:
+            response = local.session.get(f"{api_url}/search", params={"q": text, "limit": args.limit})
+        response.raise_for_status()
+        return kind, len(response.json()["episodes"]), timer.elapsed
+
+    with RssSampler(args.pid) as rss, Timer() as total, ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(search, queries))
+    latencies = defaultdict(list)
+    for kind, _, latency in results:
+        latencies[kind].append(latency)
+    print(f"{len(results)} searches, {len(results) / total.elapsed:.0f} searches/s, "
+          f"{sum(count for _, count, _ in results) / len(results):.1f} episodes per response")
+    print(f"all: {latency_summary([latency for _, _, latency in results])}")
+    for kind, values in sorted(latencies.items()):
+        print(f"{kind} terms ({len(values)}): {latency_summary(values)}")
+    print(rss.report())
+
+    if args.drop:
+        deleted = database.episodes.delete_many({"podcast_id": podcast_id}).deleted_count
+        print(f"deleted {deleted} seeded episodes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark concurrent seeks: random Range requests against episode audio.
+
+Uploads a --size-mb episode (or uses --episode) and sends --requests GETs
+for random byte ranges of --range-kb, --concurrency at a time, the way audio
+players seek. --ranges above 1 asks for multipart/byteranges responses.
+--compare repeats the run against another URL serving the same bytes, such
+as an nginx location using X-Accel-Redirect or a baseline checkout:
+
+    python scripts/bench_seek.py --pid $SERVER_PID --concurrency 64 \\
+        --compare http://localhost/api/episodes/{episode_id}/audio
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchlib import (
+    RssSampler, Timer, argument_parser, create_podcast, latency_summary, mib, register, upload_episode,
+)
+
+
+def run(url: str, size: int, args) -> None:
+    local = threading.local()
+
+    def seek(_):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        length = args.range_kb * 1024
+        starts = sorted(random.randrange(0, size - length) for _ in range(args.ranges))
+        header = "bytes=" + ",".join(f"{start}-{start + length - 1}" for start in starts)
+        with Timer() as timer:
+            response = local.session.get(url, headers={"Range": header})
+            body = response.content
+        assert response.status_code == 206, f"{response.status_code} for {header}"
+        if args.ranges == 1:
+            assert len(body) == length, f"{len(body)} bytes for {header}"
+        return timer.elapsed, len(body)
+
+    with RssSampler(args.pid) as rss, Timer() as total, ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(seek, range(args.requests)))
+    latencies = [latency for latency, _ in results]
+    received = sum(length for _, length in results)
+    print(url)
+    print(f"  {args.requests / total.elapsed:.0f} requests/s, {mib(received) / total.elapsed:.1f} MiB/s")
+    print(f"  latency: {latency_summary(latencies)}")
+    print(f"  {rss.report()}")
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--episode", help="seek in this episode instead of uploading one")
+    parser.add_argument("--size-mb", type=int, default=64, help="size of the uploaded episode in MiB (default: 64)")
+    parser.add_argument("--requests", type=int, default=2000, help="number of requests (default: 2000)")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once (default: 32)")
+    parser.add_argument("--range-kb", type=int, default=64, help="bytes per range in KiB (default: 64)")
+    parser.add_argument("--ranges", type=int, default=1, help="ranges per request (default: 1)")
+    parser.add_argument("--compare", help="another URL for the same audio; {episode_id} and {audio_file} are filled in")
+    args = parser.parse_args()
+
+    api_url = f"{args.url}/api"
+    if args.episode:
+        response = requests.get(f"{api_url}/episodes/{args.episode}")
+        response.raise_for_status()
+        episode = response.json()
+    else:
+        _, headers = register(api_url)
+        episode = upload_episode(api_url, headers, create_podcast(api_url, headers), args.size_mb * 1024 * 1024)
+
+    print(f"{args.requests} requests for {args.ranges} x {args.range_kb} KiB, {args.concurrency} at a time, "
+          f"in {mib(episode['size']):.0f} MiB")
+    run(f"{api_url}/episodes/{episode['id']}/audio", episode["size"], args)
+    if args.compare:
+        run(args.compare.format(episode_id=episode["id"], audio_file=episode["audio_file"]), episode["size"], args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark list serialization: page_response with FAST_JSON on and off.
+
+Encodes pages of synthetic Episode documents, shaped as Mongo returns them,
+through page_response both ways and checks the two bodies are identical.
+FAST_JSON dumps the projected documents straight to JSON; without it every
+document is validated into an Episode and run through jsonable_encoder.
+Runs in-process, no server needed:
+
+    python scripts/bench_serialize.py --rows 1000 10000
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from benchlib import Timer, import_server
+
+server = import_server()
+
+
+def episode_documents(count: int, rng: random.Random) -> list:
+    started = datetime.utcnow() - timedelta(days=365)
+    documents = []
+    for index in range(count):
+        document = {
+            "id": str(uuid.uuid4()),
+            "podcast_id": str(uuid.uuid4()),
+            "title": f"Episode {index}: ünïcode and \"quotes\"",
+            "description": " ".join(rng.choices(["talk", "news", "music", "tech", "story"], k=30)),
+            "audio_file": f"{index % 256:02x}/{uuid.uuid4().hex}.mp3",
+            "created_at": started + timedelta(seconds=index * 30, microseconds=rng.randrange(1000000)),
+        }
+        # Processed episodes carry media fields, older ones lack them entirely
+        if index % 3:
+            document.update(duration=rng.randint(300, 7200), size=rng.randint(1, 200) * 1024 * 1024,
+                            sha256=uuid.uuid4().hex * 2, bitrate=128000, sample_rate=44100, channels=2,
+                            hls=True, peaks=bool(index % 2))
+        documents.append(document)
+    return documents
+
+
+def encode(documents: list, fast: bool) -> bytes:
+    server.FAST_JSON = fast
+    page = SimpleNamespace(fields=None)
+    names = list(server.Episode.model_fields)
+    return server.page_response(documents, server.Episode, names, page, {}).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="page sizes (default: 1000 10000)")
+    parser.add_argument("--repeat", type=int, default=20, help="encodings per measurement (default: 20)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"orjson {'available' if server.orjson is not None else 'missing, FAST_JSON uses json'}")
+    for rows in args.rows:
+        documents = episode_documents(rows, rng)
+        fast, slow = encode(documents, True), encode(documents, False)
+        assert fast == slow, "FAST_JSON changed the response body"
+        timings = {}
+        for mode in (True, False):
+            with Timer() as timer:
+                for _ in range(args.repeat):
+                    encode(documents, mode)
+            timings[mode] = timer.elapsed / args.repeat
+        print(f"{rows} rows, {len(fast) / 1024:.0f} KiB: {timings[False] * 1000:.1f} ms with models, "
+              f"{timings[True] * 1000:.1f} ms with FAST_JSON ({timings[False] / timings[True]:.1f}x), "
+              "bodies identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark live updates: many idle /api/events/stream connections on one worker.
+
+Opens --connections Server-Sent Events streams, holds them idle for --hold
+seconds while sampling the server's RSS, then creates a podcast and measures
+how long the podcast_created event takes to reach every stream. Both ends
+need a file descriptor limit above the connection count (ulimit -n), and the
+server STREAM_MAX_CONNECTIONS at least as high:
+
+    ulimit -n 20000
+    RATE_LIMIT_RATE=0 uvicorn server:app --port 8001 &
+    python scripts/bench_sse.py --pid $! --connections 10000
+"""
+import asyncio
+import ssl
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from benchlib import RssSampler, argument_parser, create_podcast, latency_summary, mib, register
+
+
+class Stream:
+    """One raw HTTP/1.1 event stream, watched for a marker string."""
+
+    def __init__(self):
+        self.reader = self.writer = None
+        self.received = 0
+        self.found = asyncio.Event()
+        self.found_at = None
+
+    async def open(self, url):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.reader, self.writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if parts.scheme == "https" else None
+        )
+        self.writer.write(f"GET /api/events/stream HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                          f"Accept: text/event-stream\r\n\r\n".encode())
+        status = await self.reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(status.decode().strip())
+        await self.reader.readuntil(b"\r\n\r\n")
+
+    async def watch(self, marker: bytes):
+        tail = b""
+        while data := await self.reader.read(65536):
+            self.received += len(data)
+            if marker in tail + data:
+                self.found_at = time.perf_counter()
+                self.found.set()
+            tail = data[-len(marker):]
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def run(args):
+    api_url = f"{args.url}/api"
+    marker = f"Benchmark {uuid.uuid4().hex[:8]}"
+    streams = [Stream() for _ in range(args.connections)]
+    handshakes = asyncio.Semaphore(args.open_concurrency)
+
+    async def connect(stream):
+        async with handshakes:
+            await stream.open(args.url)
+
+    with RssSampler(args.pid) as rss:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(connect(stream) for stream in streams), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, BaseException)]
+        streams = [stream for stream, result in zip(streams, results) if not isinstance(result, BaseException)]
+        print(f"opened {len(streams)} streams in {time.perf_counter() - started:.1f} s, {len(failures)} failed"
+              + (f" (first: {failures[0]!r})" if failures else ""))
+        watchers = [asyncio.create_task(stream.watch(marker.encode())) for stream in streams]
+        await asyncio.sleep(args.hold)
+    print(f"held them idle for {args.hold:.0f} s, {rss.report()}")
+    if rss.pid and streams:
+        print(f"about {(rss.last - rss.baseline) / len(streams) / 1024:.1f} KiB of server RSS per stream")
+
+    # requests blocks, so run it off the loop that reads the streams
+    _, headers = await asyncio.to_thread(register, api_url)
+    published = time.perf_counter()
+    await asyncio.to_thread(create_podcast, api_url, headers, marker)
+    waiters = [asyncio.create_task(stream.found.wait()) for stream in streams]
+    if waiters:
+        await asyncio.wait(waiters, timeout=args.delivery_timeout)
+    for waiter in waiters:
+        waiter.cancel()
+    delivered = [stream.found_at - published for stream in streams if stream.found_at]
+    print(f"podcast_created reached {len(delivered)} of {len(streams)} streams")
+    if delivered:
+        print(f"delivery latency: {latency_summary(delivered)}")
+    print(f"received {mib(sum(stream.received for stream in streams)):.1f} MiB in total")
+
+    for stream in streams:
+        stream.close()
+    for watcher in watchers:
+        watcher.cancel()
+    await asyncio.gather(*watchers, return_exceptions=True)
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10000, help="streams to open (default: 10000)")
+    parser.add_argument("--open-concurrency", type=int, default=200, help="handshakes at once (default: 200)")
+    parser.add_argument("--hold", type=float, default=30, help="seconds to hold the streams idle (default: 30)")
+    parser.add_argument("--delivery-timeout", type=float, default=30, help="seconds to wait for the event "
+                        "(default: 30)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
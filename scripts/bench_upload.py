@@ -0,0 +1,48 @@
+"""Benchmark episode uploads: throughput and the server's peak RSS.
+
+Uploads --count episodes of --size-mb each, --concurrency at a time, through
+POST /api/podcasts/{id}/episodes. With --pid the server's RSS is sampled
+throughout, which shows whether memory stays bounded as uploads grow:
+
+    RATE_LIMIT_RATE=0 uvicorn server:app --port 8001 &
+    python scripts/bench_upload.py --pid $! --size-mb 1024 --concurrency 4
+
+The uploaded episodes are left in place.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchlib import RssSampler, Timer, argument_parser, create_podcast, latency_summary, mib, register, upload_episode
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=1024, help="size of each upload in MiB (default: 1024)")
+    parser.add_argument("--count", type=int, default=4, help="number of uploads (default: 4)")
+    parser.add_argument("--concurrency", type=int, default=1, help="uploads in flight at once (default: 1)")
+    args = parser.parse_args()
+
+    api_url = f"{args.url}/api"
+    _, headers = register(api_url)
+    podcast_id = create_podcast(api_url, headers)
+    size = args.size_mb * 1024 * 1024
+
+    def upload(_):
+        with requests.Session() as session, Timer() as timer:
+            episode = upload_episode(api_url, headers, podcast_id, size, session)
+        assert episode["size"] == size, f"server stored {episode['size']} bytes, sent {size}"
+        return timer.elapsed
+
+    print(f"Uploading {args.count} x {args.size_mb} MiB, {args.concurrency} at a time, to {args.url}")
+    with RssSampler(args.pid) as rss, Timer() as total, ThreadPoolExecutor(args.concurrency) as pool:
+        durations = list(pool.map(upload, range(args.count)))
+
+    print(f"per upload: {latency_summary(durations)}")
+    print(f"per upload throughput: {mib(size) / (sum(durations) / len(durations)):.1f} MiB/s")
+    print(f"aggregate throughput: {mib(size * args.count) / total.elapsed:.1f} MiB/s over {total.elapsed:.1f} s")
+    print(rss.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Helpers shared by the benchmark scripts in this directory.
+
+The benchmarks drive a running backend over HTTP, like backend_test.py. Start
+it with RATE_LIMIT_RATE=0 so the rate limiter does not shape the load, and pass
+--pid to sample the server's resident memory while a benchmark runs. The
+in-process benchmarks, and the tests, load server.py with import_server.
+"""
+import argparse
+import importlib
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import requests
+
+
+def argument_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--url", default=os.environ.get("BACKEND_URL", "http://localhost:8001"),
+                        help="backend base URL (default: $BACKEND_URL or http://localhost:8001)")
+    parser.add_argument("--pid", type=int, help="server process id, to sample its RSS from /proc")
+    return parser
+
+
+def import_server(db_name: str = "podcasthub_bench"):
+    """Import backend/server.py as a module, without a running database."""
+    # server.py connects lazily, but reads these at import time
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", db_name)
+    backend = str(Path(__file__).resolve().parent.parent / "backend")
+    if backend not in sys.path:
+        sys.path.insert(0, backend)
+    return importlib.import_module("server")
+
+
+def register(api_url: str, role: str = "podcaster", password: str = "BenchPassword123!") -> tuple:
+    """Create a user and return (email, Authorization headers)."""
+    email = f"bench_{uuid.uuid4().hex}@bench.test"
+    response = requests.post(f"{api_url}/auth/register", json={
+        "email": email, "username": f"bench_{uuid.uuid4().hex[:8]}", "password": password, "role": role,
+    })
+    response.raise_for_status()
+    response = requests.post(f"{api_url}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return email, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def create_podcast(api_url: str, headers: dict, title: str = None) -> str:
+    response = requests.post(f"{api_url}/podcasts", headers=headers, json={
+        "title": title or f"Benchmark {uuid.uuid4().hex[:8]}", "description": "Benchmark data",
+        "category": "Technology",
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+class MultipartUpload:
+    """A multipart/form-data episode upload of ``size`` generated bytes.
+
+    The body is produced as it is read, so the client never holds more than one
+    block of it, and it has a length, so requests sends a Content-Length.
+    """
+
+    def __init__(self, size: int, title: str = "Benchmark episode", block_size: int = 1024 * 1024):
+        self.boundary = uuid.uuid4().hex
+        self.block = os.urandom(block_size)  # random per upload, so uploads are not deduplicated
+        fields = "".join(
+            f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n"
+            for name, value in (("title", title), ("description", "Benchmark upload"))
+        )
+        self.head = (fields + f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"audio_file\"; "
+                     f"filename=\"bench.mp3\"\r\nContent-Type: audio/mpeg\r\n\r\n").encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.size = size
+        self.position = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = len(self)
+        parts = []
+        while n > 0 and self.position < len(self):
+            offset = self.position
+            if offset < len(self.head):
+                part = self.head[offset:offset + n]
+            elif offset < len(self.head) + self.size:
+                offset -= len(self.head)
+                start = offset % len(self.block)
+                part = self.block[start:start + min(n, self.size - offset)]
+            else:
+                offset -= len(self.head) + self.size
+                part = self.tail[offset:offset + n]
+            parts.append(part)
+            self.position += len(part)
+            n -= len(part)
+        return b"".join(parts)
+
+
+def upload_episode(api_url: str, headers: dict, podcast_id: str, size: int, session=None) -> dict:
+    body = MultipartUpload(size)
+    response = (session or requests).post(
+        f"{api_url}/podcasts/{podcast_id}/episodes", data=body,
+        headers={**headers, "Content-Type": body.content_type},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+class RssSampler(threading.Thread):
+    """Samples VmRSS of a process every ``interval`` seconds while in use.
+
+    Without a pid it samples nothing.
+    """
+
+    def __init__(self, pid, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.baseline = self.peak = self.last = None
+        self.stopped = threading.Event()
+
+    def rss(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.last = self.rss()
+            self.peak = max(self.peak, self.last)
+
+    def __enter__(self):
+        if self.pid:
+            self.baseline = self.peak = self.last = self.rss()
+            self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pid:
+            self.stopped.set()
+            self.join()
+
+    def report(self) -> str:
+        if self.pid is None:
+            return "server RSS not sampled (pass --pid)"
+        return (f"server RSS: {mib(self.baseline):.1f} MiB before, {mib(self.peak):.1f} MiB peak "
+                f"(+{mib(self.peak - self.baseline):.1f} MiB), {mib(self.last):.1f} MiB after")
+
+
+def mib(size: int) -> float:
+    return size / (1024 * 1024)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of ``values``, e.g. fraction=0.99 for p99."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def latency_summary(latencies: list) -> str:
+    return ", ".join(f"p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.1f} ms"
+                     for fraction in (0.5, 0.9, 0.99)) + f", max {max(latencies) * 1000:.1f} ms"
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The tests load server.py through the benchmark helpers
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
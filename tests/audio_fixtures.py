@@ -0,0 +1,61 @@
+"""Small synthetic audio files for the media pipeline tests."""
+import io
+import wave
+
+import numpy as np
+
+from benchlib import import_server
+
+server = import_server("podcasthub_test")
+
+# MPEG-1 Layer III, 128 kbps, 44100 Hz: 417-byte frames of 1152 samples
+MP3_HEADER_STEREO = b"\xff\xfb\x90\x00"
+MP3_HEADER_MONO = b"\xff\xfb\x90\xc0"
+MP3_FRAME_LENGTH = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def mp3_frame(header=MP3_HEADER_STEREO, payload=b""):
+    return header + payload + bytes(MP3_FRAME_LENGTH - len(header) - len(payload))
+
+
+def id3v2_tag(size=100):
+    return b"ID3\x03\x00\x00" + server.syncsafe(size) + bytes(size)
+
+
+def id3v1_tag():
+    return b"TAG" + bytes(125)
+
+
+def xing_frame(frames, audio_bytes):
+    # Stereo MPEG-1 side info is 32 bytes, the tag follows it
+    return mp3_frame(payload=bytes(32) + b"Xing" + (3).to_bytes(4, "big")
+                     + frames.to_bytes(4, "big") + audio_bytes.to_bytes(4, "big"))
+
+
+def vbri_frame(frames, audio_bytes):
+    # VBRI always sits 32 bytes after the header: version, delay and quality, then sizes
+    return mp3_frame(payload=bytes(32) + b"VBRI" + bytes(6)
+                     + audio_bytes.to_bytes(4, "big") + frames.to_bytes(4, "big"))
+
+
+def mp3_file(frames, header=MP3_HEADER_STEREO):
+    return b"".join(mp3_frame(header) for _ in range(frames))
+
+
+def wav_file(seconds, sample_rate=8000, channels=1, sample_width=2, seed=None):
+    """Silence, or with a ``seed`` a 16-bit tone plus noise."""
+    frames = int(seconds * sample_rate)
+    if seed is None:
+        pcm = bytes(frames * channels * sample_width)
+    else:
+        t = np.arange(frames) / sample_rate
+        signal = 0.5 * np.sin(2 * np.pi * 440 * t) + 0.2 * np.random.default_rng(seed).standard_normal(frames)
+        pcm = np.repeat((np.clip(signal, -1, 1) * 32767).astype("<i2"), channels).tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+    return buffer.getvalue()
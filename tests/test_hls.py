@@ -0,0 +1,84 @@
+import math
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from tests.audio_fixtures import (
+    MP3_FRAME_LENGTH, MP3_FRAME_SECONDS, id3v1_tag, id3v2_tag, mp3_file, server, wav_file, xing_frame,
+)
+
+
+class PackageHlsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def package(self, data):
+        path = self.directory / "episode.mp3"
+        path.write_bytes(data)
+        result = server.package_hls(str(path))
+        return result, server.hls_directory(path)
+
+    def read_playlist(self, output):
+        lines = (output / "index.m3u8").read_text().splitlines()
+        durations = [float(line[len("#EXTINF:"):-1]) for line in lines if line.startswith("#EXTINF:")]
+        names = [line for line in lines if line and not line.startswith("#")]
+        return lines, durations, names
+
+    def test_segments(self):
+        frames = 800  # about 20.9 seconds
+        result, output = self.package(id3v2_tag(200) + xing_frame(frames, frames * MP3_FRAME_LENGTH)
+                                      + mp3_file(frames) + id3v1_tag())
+        self.assertEqual(result, {"hls": True})
+        lines, durations, names = self.read_playlist(output)
+        self.assertEqual(lines[0], "#EXTM3U")
+        self.assertEqual(lines[-1], "#EXT-X-ENDLIST")
+        self.assertEqual(names, [f"segment_{index:05d}.mp3" for index in range(len(names))])
+        self.assertEqual(len(names), 4)
+
+        # Every segment but the last is cut at the first frame past HLS_SEGMENT_SECONDS
+        frames_per_segment = math.ceil(server.HLS_SEGMENT_SECONDS / MP3_FRAME_SECONDS)
+        for duration in durations[:-1]:
+            self.assertAlmostEqual(duration, frames_per_segment * MP3_FRAME_SECONDS, places=3)
+        self.assertAlmostEqual(sum(durations), frames * MP3_FRAME_SECONDS, places=2)
+        self.assertIn(f"#EXT-X-TARGETDURATION:{math.ceil(max(durations))}", lines)
+
+        # Each segment is a timestamp tag for its start followed by whole frames
+        elapsed = 0.0
+        for name, duration in zip(names, durations):
+            data = (output / name).read_bytes()
+            tag = server.hls_timestamp_tag(elapsed)
+            self.assertTrue(data.startswith(tag))
+            audio = data[len(tag):]
+            self.assertEqual(audio[:2], b"\xff\xfb")
+            self.assertEqual(len(audio) % MP3_FRAME_LENGTH, 0)
+            elapsed += len(audio) // MP3_FRAME_LENGTH * MP3_FRAME_SECONDS
+        self.assertAlmostEqual(elapsed, frames * MP3_FRAME_SECONDS)
+
+    def test_timestamp_tag(self):
+        tag = server.hls_timestamp_tag(2.5)
+        self.assertEqual(tag[:3], b"ID3")
+        self.assertIn(b"com.apple.streaming.transportStreamTimestamp\x00", tag)
+        self.assertEqual(int.from_bytes(tag[-8:], "big"), 225000)
+
+    def test_repackaging_replaces_output(self):
+        self.package(mp3_file(800))
+        _, output = self.package(mp3_file(100))
+        _, durations, names = self.read_playlist(output)
+        self.assertEqual(sorted(path.name for path in output.iterdir()), sorted(names + ["index.m3u8"]))
+        self.assertEqual(len(durations), 1)
+        self.assertEqual(len(list(self.directory.iterdir())), 2)
+
+    def test_wav_is_not_segmented(self):
+        # This tone happens to contain a run of what looks like MP3 frames
+        self.assertEqual(self.package(wav_file(30, sample_rate=44100, seed=14))[0], None)
+        self.assertFalse((self.directory / "episode.mp3.hls").exists())
+
+    def test_not_mp3(self):
+        self.assertEqual(self.package(bytes(4096)), (None, self.directory / "episode.mp3.hls"))
+        self.assertFalse((self.directory / "episode.mp3.hls").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import os
+import tempfile
+import unittest
+
+from tests.audio_fixtures import (
+    MP3_FRAME_LENGTH, MP3_FRAME_SECONDS, MP3_HEADER_MONO, id3v1_tag, id3v2_tag, mp3_file, server, vbri_frame,
+    wav_file, xing_frame,
+)
+
+
+def probe(parser, data):
+    return parser(io.BytesIO(data), len(data))
+
+
+class ProbeWavTest(unittest.TestCase):
+    def test_pcm(self):
+        info = probe(server.probe_wav, wav_file(2.5, sample_rate=8000, channels=1))
+        self.assertEqual(info, {"duration": 2.5, "bitrate": 128000, "sample_rate": 8000, "channels": 1})
+
+    def test_stereo(self):
+        info = probe(server.probe_wav, wav_file(1, sample_rate=44100, channels=2))
+        self.assertEqual((info["duration"], info["bitrate"], info["channels"]), (1, 1411200, 2))
+
+    def test_streamed_data_size(self):
+        # Writers that stream leave the data size at its maximum
+        data = bytearray(wav_file(1))
+        data[40:44] = b"\xff\xff\xff\xff"
+        self.assertEqual(probe(server.probe_wav, bytes(data))["duration"], 1)
+
+    def test_not_wav(self):
+        self.assertIsNone(probe(server.probe_wav, b"RIFF\x00\x00\x00\x00AVI LIST"))
+
+
+class ProbeMp3Test(unittest.TestCase):
+    def test_cbr(self):
+        info = probe(server.probe_mp3, mp3_file(100))
+        self.assertAlmostEqual(info["duration"], 100 * MP3_FRAME_LENGTH * 8 / 128000)
+        self.assertEqual((info["bitrate"], info["sample_rate"], info["channels"]), (128000, 44100, 2))
+
+    def test_mono(self):
+        self.assertEqual(probe(server.probe_mp3, mp3_file(10, MP3_HEADER_MONO))["channels"], 1)
+
+    def test_id3_tags_are_not_audio(self):
+        info = probe(server.probe_mp3, id3v2_tag(500) + mp3_file(100) + id3v1_tag())
+        self.assertAlmostEqual(info["duration"], 100 * MP3_FRAME_LENGTH * 8 / 128000)
+
+    def test_xing(self):
+        data = xing_frame(frames=1000, audio_bytes=250000) + mp3_file(20)
+        info = probe(server.probe_mp3, data)
+        self.assertAlmostEqual(info["duration"], 1000 * MP3_FRAME_SECONDS)
+        self.assertEqual(info["bitrate"], int(250000 * 8 / (1000 * MP3_FRAME_SECONDS)))
+
+    def test_vbri(self):
+        data = vbri_frame(frames=500, audio_bytes=100000) + mp3_file(20)
+        info = probe(server.probe_mp3, data)
+        self.assertAlmostEqual(info["duration"], 500 * MP3_FRAME_SECONDS)
+        self.assertEqual(info["bitrate"], int(100000 * 8 / (500 * MP3_FRAME_SECONDS)))
+
+    def test_garbage(self):
+        self.assertIsNone(probe(server.probe_mp3, os.urandom(16) + b"\x00" * 4096))
+
+
+class ProbeAudioTest(unittest.TestCase):
+    def probe_file(self, data):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            return server.probe_audio(f.name)
+
+    def test_dispatches_on_magic_and_rounds_duration(self):
+        self.assertEqual(self.probe_file(wav_file(3.4))["duration"], 3)
+        self.assertEqual(self.probe_file(mp3_file(200))["duration"], round(200 * MP3_FRAME_LENGTH * 8 / 128000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from tests.audio_fixtures import server, wav_file
+
+
+class PeaksTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = Path(tempfile.mkdtemp())
+        audio_path = cls.directory / "episode.wav"
+        audio_path.write_bytes(wav_file(10, sample_rate=8000, seed=1))
+        assert server.compute_peaks(str(audio_path)) == {"peaks": True}
+        cls.path = server.peaks_path(audio_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_levels(self):
+        sample_rate, samples_per_bucket, first, data = server.read_peaks(self.path, 0, 0, None)
+        self.assertEqual((sample_rate, first), (8000, 0))
+        self.assertEqual(len(data) // 2, 10 * 8000 // samples_per_bucket)
+        _, coarser, _, coarse = server.read_peaks(self.path, 1, 0, None)
+        self.assertEqual(coarser, samples_per_bucket * server.PEAKS_ZOOM_FACTOR)
+        self.assertLess(len(coarse), len(data))
+
+    def test_range(self):
+        _, samples_per_bucket, first, data = server.read_peaks(self.path, 0, 2, 4)
+        self.assertEqual(first, 2 * 8000 // samples_per_bucket)
+        self.assertEqual(len(data) // 2, 2 * 8000 // samples_per_bucket)
+
+    def test_range_past_the_end(self):
+        *_, data = server.read_peaks(self.path, 0, 1e308, 1e308)
+        self.assertEqual(data, b"")
+        *_, data = server.read_peaks(self.path, 0, 9, 1e308)
+        self.assertGreater(len(data), 0)
+
+    def test_unknown_zoom(self):
+        self.assertIsNone(server.read_peaks(self.path, server.PEAKS_LEVELS, 0, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
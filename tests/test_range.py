@@ -0,0 +1,52 @@
+import unittest
+
+from fastapi import HTTPException
+
+from tests.audio_fixtures import server
+
+
+class ParseRangeHeaderTest(unittest.TestCase):
+    def assertUnsatisfiable(self, header, size):
+        with self.assertRaises(HTTPException) as raised:
+            server.parse_range_header(header, size)
+        self.assertEqual(raised.exception.status_code, 416)
+        self.assertEqual(raised.exception.headers["Content-Range"], f"bytes */{size}")
+
+    def test_single_ranges(self):
+        self.assertEqual(server.parse_range_header("bytes=0-99", 1000), [[0, 99]])
+        self.assertEqual(server.parse_range_header("bytes=500-", 1000), [[500, 999]])
+        self.assertEqual(server.parse_range_header("bytes=900-5000", 1000), [[900, 999]])
+
+    def test_suffix_ranges(self):
+        self.assertEqual(server.parse_range_header("bytes=-100", 1000), [[900, 999]])
+        self.assertEqual(server.parse_range_header("bytes=-5000", 1000), [[0, 999]])
+        self.assertUnsatisfiable("bytes=-0", 1000)
+
+    def test_empty_file(self):
+        self.assertUnsatisfiable("bytes=-10", 0)
+        self.assertUnsatisfiable("bytes=0-", 0)
+        self.assertUnsatisfiable("bytes=0-10,-10", 0)
+
+    def test_unsatisfiable(self):
+        self.assertUnsatisfiable("bytes=1000-", 1000)
+        self.assertUnsatisfiable("bytes=2000-3000,1000-", 1000)
+
+    def test_multiple_ranges(self):
+        self.assertEqual(server.parse_range_header("bytes=0-9, 20-29", 100), [[0, 9], [20, 29]])
+        # Overlapping and adjacent ranges are merged, and satisfiable ones kept
+        self.assertEqual(server.parse_range_header("bytes=20-29,0-9,5-14,15-19", 100), [[0, 29]])
+        self.assertEqual(server.parse_range_header("bytes=0-9,500-", 100), [[0, 9]])
+
+    def test_too_many_ranges(self):
+        header = "bytes=" + ",".join(f"{n * 10}-{n * 10}" for n in range(server.AUDIO_MAX_RANGES + 1))
+        self.assertIsNone(server.parse_range_header(header, 1000))
+
+    def test_malformed(self):
+        for header in ("items=0-9", "bytes=", "bytes=abc", "bytes=9-0", "bytes=-", "bytes=1-2-3",
+                       "bytes=0-9,x", "bytes= -1 0", "bytes=\xb2-", "bytes=0-\u0661"):
+            with self.subTest(header=header):
+                self.assertIsNone(server.parse_range_header(header, 1000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Fake credentials, so nothing here can reach a real account
+for name, value in (("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing"),
+                    ("AWS_DEFAULT_REGION", "us-east-1")):
+    os.environ[name] = value
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from tests.audio_fixtures import server  # noqa: E402
+
+BUCKET = "podcasthub-media"
+
+
+class S3StorageTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        mocked = mock_aws()
+        mocked.start()
+        self.addCleanup(mocked.stop)
+        self.s3 = boto3.client("s3")
+        self.s3.create_bucket(Bucket=BUCKET)
+        self.storage = server.S3Storage(f"s3://{BUCKET}/audio", None, 60)
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        cache_dir = mock.patch.object(server, "STORAGE_CACHE_DIR", self.directory / "cache")
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+
+    def write(self, name, data):
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+    def object_keys(self):
+        return sorted(item["Key"] for item in self.s3.list_objects_v2(Bucket=BUCKET).get("Contents", []))
+
+    def read_object(self, key):
+        return self.s3.get_object(Bucket=BUCKET, Key=f"audio/{key}")["Body"].read()
+
+    async def test_put_and_exists(self):
+        self.assertFalse(await self.storage.exists("ab/cd/episode.mp3"))
+        source = self.write("upload.part", b"first")
+        await self.storage.put(source, "ab/cd/episode.mp3")
+        self.assertFalse(source.exists())
+        self.assertTrue(await self.storage.exists("ab/cd/episode.mp3"))
+        self.assertEqual(self.object_keys(), ["audio/ab/cd/episode.mp3"])
+
+        # Keys are content addresses, so an existing object is never replaced
+        await self.storage.put(self.write("again.part", b"second"), "ab/cd/episode.mp3")
+        self.assertEqual(self.read_object("ab/cd/episode.mp3"), b"first")
+
+    async def test_upload_url_and_verify(self):
+        data = b"audio bytes"
+        checksum = hashlib.sha256(data).hexdigest()
+        url, headers = self.storage.upload_url("ab/cd/episode.mp3", checksum)
+        self.assertIn(f"{BUCKET}", url)
+        self.assertIn("audio/ab/cd/episode.mp3", url)
+        self.assertEqual(set(headers), {"x-amz-checksum-sha256"})
+        self.assertFalse(await self.storage.verify("ab/cd/episode.mp3", checksum, len(data)))
+
+        self.s3.put_object(Bucket=BUCKET, Key="audio/ab/cd/episode.mp3", Body=data)
+        self.assertTrue(await self.storage.verify("ab/cd/episode.mp3", checksum, len(data)))
+        self.assertFalse(await self.storage.verify("ab/cd/episode.mp3", checksum, len(data) + 1))
+
+    async def test_verify_rejects_checksum_mismatch(self):
+        data = b"audio bytes"
+        self.s3.put_object(Bucket=BUCKET, Key="audio/ab/cd/episode.mp3", Body=b"other bytes")
+        self.assertFalse(await self.storage.verify("ab/cd/episode.mp3", hashlib.sha256(data).hexdigest(), len(data)))
+
+    async def test_move(self):
+        self.s3.put_object(Bucket=BUCKET, Key="audio/uploads/session.mp3", Body=b"first")
+        await self.storage.move("uploads/session.mp3", "ab/cd/episode.mp3")
+        self.assertEqual(self.object_keys(), ["audio/ab/cd/episode.mp3"])
+        self.assertEqual(self.read_object("ab/cd/episode.mp3"), b"first")
+        head = self.s3.head_object(Bucket=BUCKET, Key="audio/ab/cd/episode.mp3")
+        self.assertEqual(head["ContentType"], "audio/mpeg")
+
+        # As with put(), an existing object is kept and the upload discarded
+        self.s3.put_object(Bucket=BUCKET, Key="audio/uploads/other.mp3", Body=b"second")
+        await self.storage.move("uploads/other.mp3", "ab/cd/episode.mp3")
+        self.assertEqual(self.object_keys(), ["audio/ab/cd/episode.mp3"])
+        self.assertEqual(self.read_object("ab/cd/episode.mp3"), b"first")
+
+    async def publish_episode(self, key):
+        audio = self.write("work/episode.mp3", b"audio")
+        for name in ("index.m3u8", "segment_00000.mp3", "segment_00001.mp3"):
+            self.write(f"work/episode.mp3.hls/{name}", name.encode())
+        self.write("work/episode.mp3.peaks", b"PEAK")
+        await self.storage.put(self.write("upload.part", b"audio"), key)
+        await self.storage.publish(key, audio)
+
+    async def test_publish_sidecars(self):
+        await self.publish_episode("ab/cd/episode.mp3")
+        self.assertEqual(self.object_keys(), [
+            "audio/ab/cd/episode.mp3",
+            "audio/ab/cd/episode.mp3.hls/index.m3u8",
+            "audio/ab/cd/episode.mp3.hls/segment_00000.mp3",
+            "audio/ab/cd/episode.mp3.hls/segment_00001.mp3",
+            "audio/ab/cd/episode.mp3.peaks",
+        ])
+        head = self.s3.head_object(Bucket=BUCKET, Key="audio/ab/cd/episode.mp3.hls/segment_00000.mp3")
+        self.assertEqual(head["ContentType"], "audio/mpeg")
+        path = await self.storage.cached_file("ab/cd/episode.mp3.hls/index.m3u8")
+        self.assertEqual(path.read_bytes(), b"index.m3u8")
+
+    async def test_delete_removes_sidecars(self):
+        await self.publish_episode("ab/cd/episode.mp3")
+        await self.storage.put(self.write("other.part", b"other"), "ab/cd/other.mp3")
+        await self.storage.delete("ab/cd/episode.mp3")
+        self.assertEqual(self.object_keys(), ["audio/ab/cd/other.mp3"])
+
+    async def test_cached_file_missing(self):
+        with self.assertRaises(FileNotFoundError):
+            await self.storage.cached_file("ab/cd/missing.mp3.peaks")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from fastapi import HTTPException
+
+from tests.audio_fixtures import server
+
+USER = SimpleNamespace(id="creator")
+
+
+class SlowRequest:
+    """A chunk PUT whose body arrives in two parts, the second once released."""
+
+    def __init__(self, first: bytes, second: bytes, released: bool = False):
+        self.parts = (first, second)
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        if released:
+            self.release.set()
+
+    async def stream(self):
+        yield self.parts[0]
+        self.started.set()
+        await self.release.wait()
+        yield self.parts[1]
+
+
+class UploadSessionCompletionTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        for name, value in (("UPLOAD_SESSION_DIR", directory), ("add_episode", mock.AsyncMock())):
+            patcher = mock.patch.object(server, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.stored = []
+        patcher = mock.patch.object(server, "store_blob", self.store_blob)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Every byte has arrived once, the client is resending the first chunk
+        self.session = server.UploadSession(
+            podcast_id="podcast", creator_id=USER.id, title="Episode", description="", filename="episode.mp3",
+            size=8, chunk_size=4, expires_at=datetime.utcnow() + timedelta(hours=1),
+        )
+        self.meta_path, self.data_path, ranges_path = server.upload_session_paths(self.session.id)
+        self.meta_path.write_text(self.session.json())
+        self.data_path.write_bytes(b"xxxxyyyy")
+        ranges_path.write_text("0 8\n")
+
+    async def store_blob(self, source, checksum, size, extension):
+        self.stored.append((checksum, source.read_bytes()))
+        return {"_id": checksum, "path": "blob.mp3", "size": size, "refs": 1}
+
+    async def put_chunk(self, request):
+        session = await server.load_upload_session(self.session.id, USER)
+        return await server.write_upload_chunk(session, 0, request)
+
+    async def test_complete_waits_for_chunk_writes(self):
+        request = SlowRequest(b"ab", b"cd")
+        writer = asyncio.create_task(self.put_chunk(request))
+        self.addCleanup(request.release.set)
+        await request.started.wait()
+
+        with self.assertRaises(HTTPException) as raised:
+            await server.complete_upload_session(self.session.id, USER)
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertEqual(self.stored, [])
+        self.assertTrue(self.meta_path.exists())  # the claim was given back
+
+        request.release.set()
+        await writer
+        await server.complete_upload_session(self.session.id, USER)
+        data = b"abcdyyyy"
+        self.assertEqual(self.stored, [(hashlib.sha256(data).hexdigest(), data)])
+
+    async def test_chunk_writes_refused_while_completing(self):
+        # Loaded before completion claimed the session, written during it
+        session = await server.load_upload_session(self.session.id, USER)
+        refused = []
+
+        async def store_blob(source, checksum, size, extension):
+            try:
+                await server.write_upload_chunk(session, 0, SlowRequest(b"ab", b"cd", released=True))
+            except HTTPException as e:
+                refused.append(e.status_code)
+            return await self.store_blob(source, checksum, size, extension)
+
+        with mock.patch.object(server, "store_blob", store_blob):
+            await server.complete_upload_session(self.session.id, USER)
+        self.assertEqual(refused, [409])
+        data = b"xxxxyyyy"
+        self.assertEqual(self.stored, [(hashlib.sha256(data).hexdigest(), data)])
+
+    async def test_chunk_write_after_claim(self):
+        session = await server.load_upload_session(self.session.id, USER)
+        with server.lock_upload_session(self.meta_path, True, "busy"):
+            with self.assertRaises(HTTPException) as raised:
+                await server.write_upload_chunk(session, 0, SlowRequest(b"ab", b"cd", released=True))
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertEqual(self.data_path.read_bytes(), b"xxxxyyyy")
+
+
+if __name__ == "__main__":
+    unittest.main()